@@ -0,0 +1,135 @@
+import bz2
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+class ParallelBz2:
+
+    # bzip2 data consists of independent blocks (max. 900k uncompressed each),
+    # every block starts with the 48 bit block magic and the stream ends with
+    # the 48 bit end of stream magic followed by the combined crc.
+    # Both markers are not byte aligned.
+    block_magic = 0x314159265359
+    eos_magic = 0x177245385090
+    magic_mask = (1 << 48) - 1
+    chunk_size = 1024 * 1024
+    # blocks submitted to the pool ahead of the consumer per worker
+    blocks_ahead = 2
+
+    @staticmethod
+    def findMarkers(data, magic, start=0, end=None):
+        # returns the sorted bit offsets of the 48 bit magic within data which start in the bytes start .. end - 1
+        if end == None:
+            end = len(data)
+        markers = []
+        for shift in range(8):
+            # the magic starting at bit 'shift' of a byte always covers the following 5 bytes completely
+            pattern = (magic << (16 - shift)).to_bytes(8, 'big')[1:6]
+            pos = data.find(pattern, start + 1)
+            while pos != -1 and pos - 1 < end:
+                markerStart = pos - 1
+                window = int.from_bytes(data[markerStart:markerStart + 7].ljust(7, b'\x00'), 'big')
+                if (window >> (8 - shift)) & ParallelBz2.magic_mask == magic:
+                    markers.append(markerStart * 8 + shift)
+                pos = data.find(pattern, pos + 1)
+        markers.sort()
+        return markers
+
+    @staticmethod
+    def decompressBlock(blockBytes, startBit, endBit):
+        # wraps the block into a single block bzip2 stream and decompresses it,
+        # startBit and endBit are relative to blockBytes
+        bitLength = endBit - startBit
+        block = int.from_bytes(blockBytes, 'big') >> (len(blockBytes) * 8 - endBit)
+        block &= (1 << bitLength) - 1
+        blockCrc = (block >> (bitLength - 80)) & 0xffffffff
+        # for a single block stream the combined crc equals the block crc
+        stream = (((block << 48) | ParallelBz2.eos_magic) << 32) | blockCrc
+        streamBits = bitLength + 80
+        padding = -streamBits % 8
+        stream <<= padding
+        # level 9 allows blocks of every size
+        return bz2.decompress(b'BZh9' + stream.to_bytes((streamBits + padding) // 8, 'big'))
+
+    @staticmethod
+    def iterDecompressed(bzStream, workers=None):
+        # yields the decompressed blocks in order while the stream is still being read:
+        # a block is submitted to the pool as soon as the marker after it (next block or end of stream) arrived
+        maxTasks = (workers or os.cpu_count() or 1) * ParallelBz2.blocks_ahead
+        executor = ProcessPoolExecutor(max_workers=workers)
+        tasks = deque()
+        data = bytearray()
+        markers = [] # (bit offset in data, isBlock) of the markers which are not processed yet
+        scanned = 0 # the markers starting before this byte of data are known
+        foundBlock = False
+        eof = False
+        try:
+            while not eof:
+                chunk = bzStream.read(ParallelBz2.chunk_size)
+                eof = len(chunk) == 0
+                data += chunk
+                # a marker can only be checked when its 7 bytes are available
+                scanEnd = len(data) if eof else max(scanned, len(data) - 6)
+                newMarkers = [(bit, True) for bit in ParallelBz2.findMarkers(data, ParallelBz2.block_magic, scanned, scanEnd)]
+                newMarkers += [(bit, False) for bit in ParallelBz2.findMarkers(data, ParallelBz2.eos_magic, scanned, scanEnd)]
+                markers += sorted(newMarkers)
+                scanned = scanEnd
+                while len(markers) > 0 and (not markers[0][1] or len(markers) > 1):
+                    startBit, isBlock = markers.pop(0)
+                    if isBlock:
+                        foundBlock = True
+                        endBit = markers[0][0]
+                        startByte = startBit // 8
+                        endByte = (endBit + 7) // 8
+                        tasks.append(executor.submit(ParallelBz2.decompressBlock, bytes(data[startByte:endByte]),
+                                                     startBit - startByte * 8, endBit - startByte * 8))
+                if foundBlock:
+                    # drop the data before the next marker
+                    cut = markers[0][0] // 8 if len(markers) > 0 else scanned
+                    del data[:cut]
+                    markers = [(bit - cut * 8, isBlock) for bit, isBlock in markers]
+                    scanned -= cut
+                while len(tasks) > maxTasks:
+                    yield tasks.popleft().result()
+            assert len(markers) == 0, 'end of stream marker is missing -> wrong file format'
+            if not foundBlock:
+                yield bz2.decompress(bytes(data))
+            while len(tasks) > 0:
+                yield tasks.popleft().result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown()
+
+    @staticmethod
+    def open(bzStream, workers=None):
+        # returns a readable stream of the decompressed data
+        return io.BufferedReader(ChunkStream(ParallelBz2.iterDecompressed(bzStream, workers)))
+
+class ChunkStream(io.RawIOBase):
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b''
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.pos >= len(self.chunk):
+            self.chunk = next(self.chunks, None)
+            self.pos = 0
+            if self.chunk == None:
+                self.chunk = b''
+                return 0
+        length = min(len(buffer), len(self.chunk) - self.pos)
+        buffer[:length] = self.chunk[self.pos : self.pos + length]
+        self.pos += length
+        return length
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+        super().close()
@@ -0,0 +1,37 @@
+from bz2_parallel import ParallelBz2
+import bz2
+import io
+import random
+
+# several blocks per stream (level 1 -> 100k blocks) and several streams like pbzip2 output
+random.seed(1)
+words = [b'RADOLAN', b'RV', b'forecast', b'precipitation', b'0', b'42', b'\x00\x29\xc4', b'\n']
+part1 = b' '.join(random.choice(words) for i in range(120000))
+part2 = bytes(random.randrange(256) for i in range(150000))
+compressed = bz2.compress(part1, 1) + bz2.compress(b'') + bz2.compress(part2, 9)
+expected = bz2.decompress(compressed)
+assert expected == part1 + part2
+
+class CountingStream(io.BytesIO):
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.maxPos = max(getattr(self, 'maxPos', 0), self.tell())
+        return data
+
+chunkSize = ParallelBz2.chunk_size
+for size in (chunkSize, 4096, 7):
+    ParallelBz2.chunk_size = size
+    with ParallelBz2.open(io.BytesIO(compressed), 2) as stream:
+        assert stream.read() == expected
+ParallelBz2.chunk_size = chunkSize
+assert ParallelBz2.open(io.BytesIO(bz2.compress(b'')), 2).read() == b''
+
+# the stream is read while the blocks are decompressed
+ParallelBz2.chunk_size = 4096
+countingStream = CountingStream(compressed)
+with ParallelBz2.open(countingStream, 2) as stream:
+    assert stream.read(1000) == expected[:1000]
+    assert countingStream.maxPos < len(compressed)
+ParallelBz2.chunk_size = chunkSize
+print('bz2 ok', len(compressed), len(expected))
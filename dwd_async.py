@@ -0,0 +1,449 @@
+import asyncio
+import copy
+import functools
+import http.client
+import io
+import ssl
+import weakref
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from dwd_http import DwdHttp, HttpCache
+from mosmix import MosmixData
+from radolan import RadolanProducts, RadolanFile
+from radolan_forecast import RadolanForecastFilter
+from radolan_forecast_array import RadolanForecastArray
+from radolan_hdf5 import RadolanHdf5Products
+from tar_stream import TarChunkParser
+
+class AsyncDwd:
+
+    # asyncio access of the DWD files: the downloads are done on the event loop (asyncio streams with
+    # keep-alive connections per event loop), only the CPU heavy decoding of the downloaded data runs in the executor
+    # failed requests are retried and redirects followed by the HttpRetryPolicy of the HttpConnectionPool of DwdHttp
+    executor = None
+    timeout = 30 # seconds without progress (connect or a single read) before a request fails
+    max_connections = 4
+    sslContext = ssl.create_default_context()
+    idleConnections = weakref.WeakKeyDictionary() # event loop -> {(scheme, host, port): [(reader, writer)]}
+
+    @staticmethod
+    def setExecutor(executor):
+        # executor - concurrent.futures executor for the decoding, None uses the default executor of the event loop,
+        # with a ProcessPoolExecutor the decoding does not block the interpreter of the event loop
+        AsyncDwd.executor = executor
+
+    @staticmethod
+    async def run(function, *args):
+        # runs function(*args) in the executor
+        return await asyncio.get_running_loop().run_in_executor(AsyncDwd.executor, functools.partial(function, *args))
+
+    @staticmethod
+    async def wait(awaitable):
+        # awaits a single step of a request (e.g. one read) with the idle timeout
+        return await asyncio.wait_for(awaitable, AsyncDwd.timeout)
+
+    @staticmethod
+    async def download(url):
+        # returns the content of the url as bytes, with the HttpCache of DwdHttp the stored file is
+        # revalidated (returned on 304) and a new one is stored
+        cache = DwdHttp.cache
+        if cache == None or urlparse(url).scheme not in ('http', 'https'):
+            status, headers, body = await AsyncDwd.request(url)
+            return body
+        stored = cache.getStored(url)
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, body = await AsyncDwd.request(url, HttpCache.getConditionalHeaders(None if stored == None else stored[0]))
+        except HTTPError as error:
+            if error.code == 304 and stored != None:
+                error.close()
+                return await loop.run_in_executor(None, AsyncDwd.__readFile, stored[1])
+            raise
+        validator = HttpCache.getResponseValidator(headers)
+        if validator != None:
+            await loop.run_in_executor(None, cache.store, url, validator, body)
+        return body
+
+    @staticmethod
+    async def parseChunks(url, parse, key=None):
+        # returns await parse(chunks) with the async iterator of the body chunks of the url, parse runs on the event loop
+        # (e.g. feeds the chunks to an incremental decoder) and may return before the end of the body, the rest is not downloaded
+        # key - reuse the result by the HttpCache of DwdHttp as long as the content is not modified, see HttpCache.getParsed
+        # (the reused result is shared and must not be modified)
+        if urlparse(url).scheme not in ('http', 'https'):
+            status, headers, body = await AsyncDwd.request(url)
+            return await parse(AsyncDwd.__iterChunks(body))
+        cache = DwdHttp.cache if key != None else None
+        result = None if cache == None else cache.getResult(url, key)
+        try:
+            response = await AsyncDwd.open(url, HttpCache.getConditionalHeaders(None if result == None else result[0]))
+        except HTTPError as error:
+            if error.code == 304 and result != None:
+                error.close()
+                return result[1]
+            raise
+        try:
+            value = await parse(response)
+        finally:
+            await response.close()
+        validator = HttpCache.getResponseValidator(response.headers)
+        if cache != None and validator != None:
+            cache.putResult(url, key, validator, value)
+        return value
+
+    @staticmethod
+    async def getLastModified(url):
+        status, headers, body = await AsyncDwd.request(url, method='HEAD')
+        return headers.get('last-modified')
+
+    @staticmethod
+    async def request(url, headers=None, method='GET'):
+        # returns (status, headers, body), raises HTTPError for status codes >= 300 (after following redirects)
+        if urlparse(url).scheme not in ('http', 'https'):
+            # e.g. file: urls
+            return await asyncio.get_running_loop().run_in_executor(None, AsyncDwd.__requestBlocking, url, headers, method)
+        response = await AsyncDwd.open(url, headers, method)
+        try:
+            return response.status, response.headers, await response.readAll()
+        finally:
+            await response.close()
+
+    @staticmethod
+    async def open(url, headers=None, method='GET'):
+        # returns the AsyncResponse of a http(s) url which has to be closed,
+        # raises HTTPError for status codes >= 300 (after following redirects)
+        policy = DwdHttp.pool.getPolicy(url)
+        while True:
+            response = await AsyncDwd.__openWithRetries(policy, headers, method)
+            if policy.isRedirect(response.status, response.headers):
+                await response.readAll()
+                await response.close()
+                policy.redirect(response.status, response.headers)
+                continue
+            if response.status >= 300:
+                body = await response.readAll() # small error bodies, the connection can be reused
+                await response.close()
+                raise policy.getError(response.status, response.reason, response.headers, body)
+            return response
+
+    @staticmethod
+    async def close():
+        # closes the idle connections of the running event loop
+        connectionsByKey = AsyncDwd.idleConnections.pop(asyncio.get_running_loop(), {})
+        for connections in connectionsByKey.values():
+            for reader, writer in connections:
+                await AsyncDwd.closeConnection(writer)
+
+    @staticmethod
+    def __requestBlocking(url, headers, method):
+        with DwdHttp.request(url, headers, method) as response:
+            return getattr(response, 'status', 200), response.headers, response.read()
+
+    @staticmethod
+    def __readFile(path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    @staticmethod
+    async def __iterChunks(data):
+        for start in range(0, len(data), AsyncResponse.chunk_size):
+            yield data[start : start + AsyncResponse.chunk_size]
+
+    @staticmethod
+    async def __openWithRetries(policy, headers, method):
+        parsedUrl = urlparse(policy.url)
+        https = parsedUrl.scheme == 'https'
+        key = (parsedUrl.scheme, parsedUrl.hostname, parsedUrl.port or (443 if https else 80))
+        path = parsedUrl.path or '/'
+        if parsedUrl.query:
+            path += '?' + parsedUrl.query
+        lines = [method + ' ' + path + ' HTTP/1.1', 'Host: ' + parsedUrl.netloc, 'Accept-Encoding: identity']
+        lines += [name + ': ' + value for name, value in (headers or {}).items()]
+        requestBytes = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        while True:
+            reused = False
+            writer = None
+            try:
+                reader, writer, reused = await AsyncDwd.__getConnection(key)
+                writer.write(requestBytes)
+                await AsyncDwd.wait(writer.drain())
+                response = await AsyncResponse.readHead(key, reader, writer, method)
+            except (OSError, EOFError, asyncio.TimeoutError):
+                if writer != None:
+                    await AsyncDwd.closeConnection(writer)
+                delay = policy.getRetryDelay(reused)
+                if delay == None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            delay = policy.getRetryDelay(status=response.status)
+            if delay != None:
+                await response.readAll()
+                await response.close()
+                await asyncio.sleep(delay)
+                continue
+            return response
+
+    @staticmethod
+    async def __getConnection(key):
+        # returns (reader, writer, reused)
+        connections = AsyncDwd.idleConnections.get(asyncio.get_running_loop(), {}).get(key)
+        while connections:
+            reader, writer = connections.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await AsyncDwd.wait(asyncio.open_connection(host, port, ssl=AsyncDwd.sslContext if scheme == 'https' else None))
+        return reader, writer, False
+
+    @staticmethod
+    def releaseConnection(key, reader, writer):
+        # keeps the connection of a completely read response for the next request of the event loop
+        connections = AsyncDwd.idleConnections.setdefault(asyncio.get_running_loop(), {}).setdefault(key, [])
+        if len(connections) < AsyncDwd.max_connections and not reader.at_eof():
+            connections.append((reader, writer))
+            return True
+        return False
+
+    @staticmethod
+    async def closeConnection(writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+
+class AsyncResponse:
+
+    # response of AsyncDwd.open, the body is read in chunks (also by async for), each read with the idle timeout,
+    # the connection is kept for further requests if the body was read completely
+    chunk_size = 64 * 1024
+
+    def __init__(self, key, reader, writer, version, status, reason, headers, method):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.keepAlive = version != 'HTTP/1.0' and headers.get('connection', '').lower() != 'close'
+        self.chunked = False
+        self.remaining = None # remaining bytes of the body or the current chunk
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            self.remaining = 0
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            self.chunked = True
+            self.remaining = 0
+        elif headers.get('content-length') != None:
+            self.remaining = int(headers.get('content-length'))
+        else:
+            self.keepAlive = False # until the server closes the connection
+        self.complete = self.remaining == 0 and not self.chunked
+
+    @staticmethod
+    async def readHead(key, reader, writer, method):
+        # reads the status line and the headers, returns the AsyncResponse
+        line = await AsyncDwd.wait(reader.readline())
+        if line == b'':
+            raise ConnectionResetError('connection closed by the server')
+        statusLine = line.decode('latin-1').split(None, 2)
+        assert len(statusLine) >= 2 and statusLine[0].startswith('HTTP/'), 'invalid status line -> no HTTP response'
+        status = int(statusLine[1])
+        reason = statusLine[2].strip() if len(statusLine) > 2 else ''
+        headerLines = []
+        while True:
+            line = await AsyncDwd.wait(reader.readline())
+            headerLines.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                break
+        headers = http.client.parse_headers(io.BytesIO(b''.join(headerLines)))
+        return AsyncResponse(key, reader, writer, statusLine[0], status, reason, headers, method)
+
+    async def read(self, size=chunk_size):
+        # returns the next part of the body (at most size bytes), b'' at its end
+        if self.complete:
+            return b''
+        if self.chunked and self.remaining == 0:
+            chunkLength = int((await AsyncDwd.wait(self.reader.readline())).split(b';')[0], 16)
+            if chunkLength == 0:
+                while (await AsyncDwd.wait(self.reader.readline())) not in (b'\r\n', b'\n', b''):
+                    pass # trailers
+                self.complete = True
+                return b''
+            self.remaining = chunkLength
+        data = await AsyncDwd.wait(self.reader.read(size if self.remaining == None else min(size, self.remaining)))
+        if self.remaining == None:
+            self.complete = len(data) == 0
+            return data
+        if len(data) == 0:
+            raise asyncio.IncompleteReadError(b'', self.remaining)
+        self.remaining -= len(data)
+        if self.remaining == 0:
+            if self.chunked:
+                await AsyncDwd.wait(self.reader.readexactly(2)) # \r\n after the chunk
+            else:
+                self.complete = True
+        return data
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await self.read()
+        if len(data) == 0:
+            raise StopAsyncIteration
+        return data
+
+    async def readAll(self):
+        chunks = []
+        while True:
+            data = await self.read()
+            if len(data) == 0:
+                return b''.join(chunks)
+            chunks.append(data)
+
+    async def close(self):
+        if self.writer == None:
+            return
+        if not (self.complete and self.keepAlive and AsyncDwd.releaseConnection(self.key, self.reader, self.writer)):
+            await AsyncDwd.closeConnection(self.writer)
+        self.writer = None
+
+class AsyncRadolanProducts:
+
+    # without forecastList / maxForecast the whole file is downloaded and decoded by the executor, otherwise
+    # the archive is decompressed while it is being downloaded (chunk by chunk in short steps of the default executor,
+    # the TarChunkParser keeps its state in this process), the requested members are decoded by the executor
+    # and the download stops after the last requested forecast
+
+    @staticmethod
+    async def getLatestRvDataTimestamp():
+        return await AsyncDwd.getLastModified(RadolanProducts.getLatestRvDataFileUrl())
+
+    @staticmethod
+    async def getLatestRvData(xyxyTupleSet):
+        return await AsyncRadolanProducts.getRvData(RadolanProducts.getLatestRvDataFileUrl(), xyxyTupleSet)
+
+    @staticmethod
+    async def getRvData(bz2RvFileUrl, xyxyTupleSet, *, forecastList=None, maxForecast=None, columnar=False):
+        forecastFilter = RadolanForecastFilter(forecastList, maxForecast)
+        if forecastFilter.lastForecast == None:
+            data = await AsyncDwd.download(bz2RvFileUrl)
+            return await AsyncDwd.run(AsyncRadolanProducts._decodeRvData, data, xyxyTupleSet, columnar)
+        # the shared result of the HttpCache is kept as RadolanForecastArray and copied (or converted) per call
+        key = ('getRvData', frozenset(xyxyTupleSet), forecastFilter.getKey())
+        data = await AsyncDwd.parseChunks(bz2RvFileUrl, functools.partial(AsyncRadolanProducts.__parseRvChunks,
+            xyxyTupleSet=xyxyTupleSet, forecastFilter=forecastFilter), key)
+        return data.copy() if columnar else await AsyncDwd.run(RadolanForecastArray.toDict, data)
+
+    @staticmethod
+    async def __parseRvChunks(chunks, xyxyTupleSet, forecastFilter):
+        loop = asyncio.get_running_loop()
+        parser = TarChunkParser(bzip2=True)
+        forecastBoxes = []
+        async for chunk in chunks:
+            for fileName, member in await loop.run_in_executor(None, parser.feed, chunk):
+                forecast = RadolanFile.readHeader(io.BytesIO(member))['forecast']
+                if forecastFilter.isAfterLast(forecast):
+                    return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyxyTupleSet, forecastBoxes)
+                if forecastFilter.isRequested(forecast):
+                    forecastBoxes.append(await AsyncDwd.run(RadolanProducts.decodeRvMember, member, xyxyTupleSet))
+                if forecastFilter.isLast(forecast):
+                    return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyxyTupleSet, forecastBoxes)
+        return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyxyTupleSet, forecastBoxes)
+
+    @staticmethod
+    def _decodeRvData(data, xyxyTupleSet, columnar):
+        return RadolanProducts.getRvData(io.BytesIO(data), xyxyTupleSet, columnar=columnar)
+
+class AsyncRadolanHdf5Products:
+
+    # like AsyncRadolanProducts, the members of the (uncompressed) tar file are decoded by the executor
+    # to get their forecast
+
+    @staticmethod
+    async def getLatestRvDataTimestamp():
+        return await AsyncDwd.getLastModified(RadolanHdf5Products.getLatestRvDataFileUrl())
+
+    @staticmethod
+    async def getLatestRvData(xyTupleSet):
+        return await AsyncRadolanHdf5Products.getRvData(RadolanHdf5Products.getLatestRvDataFileUrl(), xyTupleSet)
+
+    @staticmethod
+    async def getRvData(h5TarFileUrl, xyTupleSet, *, forecastList=None, maxForecast=None, columnar=False):
+        forecastFilter = RadolanForecastFilter(forecastList, maxForecast)
+        if forecastFilter.lastForecast == None:
+            data = await AsyncDwd.download(h5TarFileUrl)
+            return await AsyncDwd.run(AsyncRadolanHdf5Products._decodeRvData, data, xyTupleSet, columnar)
+        # the shared result of the HttpCache is kept as RadolanForecastArray and copied (or converted) per call
+        key = ('getRvData', frozenset(xyTupleSet), forecastFilter.getKey())
+        data = await AsyncDwd.parseChunks(h5TarFileUrl, functools.partial(AsyncRadolanHdf5Products.__parseRvChunks,
+            xyTupleSet=xyTupleSet, forecastFilter=forecastFilter), key)
+        return data.copy() if columnar else await AsyncDwd.run(RadolanForecastArray.toDict, data)
+
+    @staticmethod
+    async def __parseRvChunks(chunks, xyTupleSet, forecastFilter):
+        loop = asyncio.get_running_loop()
+        parser = TarChunkParser()
+        forecastBoxes = []
+        async for chunk in chunks:
+            for fileName, member in await loop.run_in_executor(None, parser.feed, chunk):
+                decoded = await AsyncDwd.run(RadolanHdf5Products.decodeRvMember, member, xyTupleSet, forecastFilter)
+                if decoded == None:
+                    continue # not a HDF5 file
+                timestamp, forecast, boxes = decoded
+                if forecastFilter.isAfterLast(forecast):
+                    return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyTupleSet, forecastBoxes)
+                if boxes != None:
+                    forecastBoxes.append(decoded)
+                if forecastFilter.isLast(forecast):
+                    return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyTupleSet, forecastBoxes)
+        return await AsyncDwd.run(RadolanForecastArray.fromBoxes, xyTupleSet, forecastBoxes)
+
+    @staticmethod
+    def _decodeRvData(data, xyTupleSet, columnar):
+        return RadolanHdf5Products.getRvData(io.BytesIO(data), xyTupleSet, columnar=columnar)
+
+class AsyncMosmixData:
+
+    @staticmethod
+    async def getMosmixDataTimestamp():
+        return await AsyncDwd.getLastModified(MosmixData.getMosmixFileUrl())
+
+    @staticmethod
+    async def getStationsDataByIds(stationIdList, elementNameList=None, hourList=None):
+        # the kmz file is downloaded on the event loop and parsed by the executor,
+        # the result is reused while the file is not modified (without hourList)
+        key = None
+        if hourList == None:
+            key = ('getStationsDataByIds', frozenset(stationIdList), None if elementNameList == None else frozenset(elementNameList))
+        data = await AsyncDwd.parseChunks(MosmixData.getMosmixFileUrl(), functools.partial(AsyncMosmixData.__parseChunks,
+            stationIdList=stationIdList, elementNameList=elementNameList, hourList=hourList), key)
+        # a result of the HttpCache is shared, see MosmixData.getStationsDataByIds
+        return data if key == None or DwdHttp.cache == None else copy.deepcopy(data)
+
+    @staticmethod
+    async def __parseChunks(chunks, stationIdList, elementNameList, hourList):
+        kmz = b''.join([chunk async for chunk in chunks])
+        return await AsyncDwd.run(AsyncMosmixData._parseStationsData, kmz, stationIdList, elementNameList, hourList)
+
+    @staticmethod
+    def _parseStationsData(kmz, stationIdList, elementNameList, hourList):
+        return MosmixData.parseStationsData(io.BytesIO(kmz), stationIdList, elementNameList, hourList)
+
+
+if __name__ == "__main__":
+    #
+    # usage examples
+    #
+
+    # fetch RADOLAN and MOSMIX data concurrently
+    from poi2RadolanRvMap import poi2RadolanRvMap
+    from poi2MosmixMap import poi2MosmixMap
+    async def main():
+        xy = poi2RadolanRvMap['70567']
+        return await asyncio.gather(
+            AsyncRadolanProducts.getLatestRvData({(xy[0], xy[1], xy[0], xy[1])}),
+            AsyncMosmixData.getStationsDataByIds({poi2MosmixMap['70567']}, {'TTT', 'FF'}, range(3, 9)))
+    print(asyncio.run(main()))
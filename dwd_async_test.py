@@ -0,0 +1,154 @@
+from dwd_async import AsyncDwd, AsyncRadolanProducts
+from dwd_http import DwdHttp, HttpCache, HttpConnectionPool
+from radolan import RadolanProducts
+from http_test_server import QuietRequestHandler, QuietHTTPServer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+class ThrottledRequestHandler(QuietRequestHandler):
+
+    protocol_version = 'HTTP/1.1' # keep-alive
+    statusCodes = []
+    clientPorts = []
+    sentBytes = 0
+    # number of requests answered with 503
+    failures = 0
+    # seconds between the parts of the body
+    delay = 0
+
+    def do_HEAD(self):
+        if not self.fail():
+            super().do_HEAD()
+
+    def do_GET(self):
+        if self.fail():
+            pass
+        elif self.path == '/stalled':
+            self.send_response(200)
+            self.send_header('Content-Length', '10')
+            self.end_headers()
+            self.wfile.write(b'12345')
+            self.wfile.flush()
+            time.sleep(2)
+            self.close_connection = True
+        else:
+            super().do_GET()
+
+    def fail(self):
+        if ThrottledRequestHandler.failures == 0:
+            return False
+        ThrottledRequestHandler.failures -= 1
+        self.send_error(503)
+        return True
+
+    def send_response(self, code, message=None):
+        ThrottledRequestHandler.statusCodes.append(code)
+        ThrottledRequestHandler.clientPorts.append(self.client_address[1])
+        super().send_response(code, message)
+
+    def copyfile(self, source, outputfile):
+        # the body is sent in parts, so a closed connection is noticed early
+        while True:
+            data = source.read(64 * 1024)
+            if len(data) == 0:
+                return
+            outputfile.write(data)
+            ThrottledRequestHandler.sentBytes += len(data)
+            time.sleep(ThrottledRequestHandler.delay)
+
+server, baseUrl = QuietHTTPServer.start(ThrottledRequestHandler, './testdata')
+url = baseUrl + 'DE1200_RV2506151820.tar.bz2'
+fileSize = os.path.getsize('./testdata/DE1200_RV2506151820.tar.bz2')
+boxes = {(478, 335, 478, 335), (100, 200, 102, 203)}
+
+async def main():
+    return await asyncio.gather(
+        AsyncRadolanProducts.getRvData(url, boxes),
+        AsyncRadolanProducts.getRvData(url, boxes, forecastList=[0, 30]),
+        AsyncDwd.getLastModified(url))
+
+data, dataFiltered, lastModified = asyncio.run(main())
+expected = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', boxes)
+assert data == expected
+assert dataFiltered == {'timestamp': expected['timestamp'], 'forecasts': [expected['forecasts'][0], expected['forecasts'][6]]}
+assert lastModified != None
+
+# decoding in a separate process, also of the members decoded while the archive is downloaded
+with ProcessPoolExecutor(1) as executor:
+    AsyncDwd.setExecutor(executor)
+    data = asyncio.run(AsyncRadolanProducts.getRvData(url, boxes))
+    filteredArray = asyncio.run(AsyncRadolanProducts.getRvData(url, boxes, forecastList=[0, 30], columnar=True))
+    AsyncDwd.setExecutor(None)
+assert data == expected and filteredArray.toDict() == dataFiltered
+print(lastModified, dataFiltered)
+class CountingExecutor(ThreadPoolExecutor):
+
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        CountingExecutor.submitted += 1
+        return super().submit(*args, **kwargs)
+
+with CountingExecutor(1) as executor:
+    AsyncDwd.setExecutor(executor)
+    assert asyncio.run(AsyncRadolanProducts.getRvData(url, boxes, forecastList=[0, 30])) == dataFiltered
+    AsyncDwd.setExecutor(None)
+assert CountingExecutor.submitted >= 2
+# the options are keyword only
+try:
+    AsyncRadolanProducts.getRvData(url, boxes, [0, 30])
+    assert False, 'TypeError expected'
+except TypeError:
+    pass
+
+# the download stops after the last requested forecast, the timeout applies to the single reads
+AsyncDwd.timeout = 0.5
+ThrottledRequestHandler.delay = 0.02
+ThrottledRequestHandler.sentBytes = 0
+start = time.time()
+assert asyncio.run(AsyncRadolanProducts.getRvData(url, boxes, maxForecast=5)) == {'timestamp': expected['timestamp'], 'forecasts': expected['forecasts'][:2]}
+assert ThrottledRequestHandler.sentBytes < fileSize / 2
+ThrottledRequestHandler.sentBytes = 0
+with open('./testdata/DE1200_RV2506151820.tar.bz2', 'rb') as file:
+    assert asyncio.run(AsyncDwd.download(url)) == file.read()
+assert time.time() - start > AsyncDwd.timeout and ThrottledRequestHandler.sentBytes >= fileSize
+ThrottledRequestHandler.delay = 0
+try:
+    asyncio.run(AsyncDwd.download(baseUrl + 'stalled'))
+    assert False, 'TimeoutError expected'
+except asyncio.TimeoutError:
+    pass
+AsyncDwd.timeout = 30
+
+# the connections are reused, 5xx responses are retried
+DwdHttp.setPool(HttpConnectionPool(retries=2, backoff=0.1))
+async def requestTwice():
+    statuses = [(await AsyncDwd.request(url, method='HEAD'))[0], (await AsyncDwd.request(url))[0]]
+    await AsyncDwd.close()
+    return statuses
+del ThrottledRequestHandler.clientPorts[:]
+assert asyncio.run(requestTwice()) == [200, 200]
+assert len(ThrottledRequestHandler.clientPorts) == 2 and len(set(ThrottledRequestHandler.clientPorts)) == 1
+ThrottledRequestHandler.failures = 2
+del ThrottledRequestHandler.statusCodes[:]
+assert asyncio.run(AsyncDwd.getLastModified(url)) == lastModified
+assert ThrottledRequestHandler.statusCodes == [503, 503, 200]
+DwdHttp.setPool(HttpConnectionPool())
+
+# downloads and parsed results are revalidated with the HttpCache
+cacheDir = tempfile.mkdtemp()
+DwdHttp.setCache(HttpCache(cacheDir))
+try:
+    del ThrottledRequestHandler.statusCodes[:]
+    for i in range(2):
+        assert asyncio.run(AsyncRadolanProducts.getRvData(url, boxes)) == expected
+        assert asyncio.run(AsyncRadolanProducts.getRvData(url, boxes, forecastList=[0, 30])) == dataFiltered
+    assert ThrottledRequestHandler.statusCodes == [200, 200, 304, 304]
+finally:
+    DwdHttp.setCache(None)
+    shutil.rmtree(cacheDir)
+server.shutdown()
@@ -0,0 +1,410 @@
+import hashlib
+import http.client
+import io
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from urllib.parse import urlparse, urljoin
+
+class HttpRetryPolicy:
+
+    # retries and redirects of a single request, shared by HttpConnectionPool (blocking) and AsyncDwd (asyncio):
+    # failed attempts (connection errors and 5xx responses) are retried with exponential backoff, a reused
+    # connection which fails (e.g. closed by the server meanwhile) is replaced at once, redirects are followed
+
+    redirect_codes = (301, 302, 303, 307, 308)
+    retry_codes = (500, 502, 503, 504)
+    max_redirects = 5
+
+    def __init__(self, url, retries, backoff):
+        self.url = url # the current url, changed by the redirects
+        self.retries = retries
+        self.backoff = backoff
+        self.attempt = 0
+        self.redirects = 0
+
+    def getRetryDelay(self, reused=False, status=None):
+        # returns the seconds to wait before the next attempt after a failed connection (status None)
+        # or a response with the status, None if the error is to be raised or the response to be returned
+        if status != None and status not in HttpRetryPolicy.retry_codes:
+            return None
+        if status == None and reused:
+            return 0 # stale keep-alive connection, not counted as attempt
+        if self.attempt == self.retries:
+            return None
+        delay = self.backoff * 2 ** self.attempt
+        self.attempt += 1
+        return delay
+
+    def isRedirect(self, status, headers):
+        return status in HttpRetryPolicy.redirect_codes and headers.get('location') != None
+
+    def redirect(self, status, headers):
+        # follows the redirect response (after its body was read), raises HTTPError after max_redirects
+        if self.redirects == HttpRetryPolicy.max_redirects:
+            raise HTTPError(self.url, status, 'too many redirects', headers, None)
+        self.redirects += 1
+        self.url = urljoin(self.url, headers.get('location'))
+
+    def getError(self, status, reason, headers, body):
+        # returns the HTTPError of a response with a status code >= 300 (and no redirect)
+        return HTTPError(self.url, status, reason, headers, io.BytesIO(body))
+
+class HttpConnectionPool:
+
+    # keep-alive connections per host which are reused by all requests,
+    # failed requests are retried and redirects followed, see HttpRetryPolicy
+
+    def __init__(self, maxConnections=4, timeout=30, retries=3, backoff=0.5):
+        # maxConnections - idle connections kept per host
+        # timeout - socket timeout in seconds
+        # retries / backoff - number of retries and the delay before the first one (doubled for every further retry)
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.sslContext = ssl.create_default_context()
+        self.idleConnections = {}
+        self.lock = threading.Lock()
+
+    def getPolicy(self, url):
+        # returns a new HttpRetryPolicy of a request with the retries and backoff of the pool
+        return HttpRetryPolicy(url, self.retries, self.backoff)
+
+    def request(self, url, headers=None, method='GET'):
+        # returns a PooledResponse, raises HTTPError for status codes >= 300 (after following redirects)
+        policy = self.getPolicy(url)
+        while True:
+            response = self.__requestWithRetries(policy, headers, method)
+            if policy.isRedirect(response.status, response.headers):
+                response.read()
+                response.close()
+                policy.redirect(response.status, response.headers)
+                continue
+            if response.status >= 300:
+                body = response.read() # small error bodies, the connection can be reused
+                response.close()
+                raise policy.getError(response.status, response.reason, response.headers, body)
+            return response
+
+    def __requestWithRetries(self, policy, headers, method):
+        parsedUrl = urlparse(policy.url)
+        key = (parsedUrl.scheme, parsedUrl.hostname, parsedUrl.port)
+        path = parsedUrl.path or '/'
+        if parsedUrl.query:
+            path += '?' + parsedUrl.query
+        while True:
+            connection, reused = self.__getConnection(key)
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                delay = policy.getRetryDelay(reused)
+                if delay == None:
+                    raise
+                time.sleep(delay)
+                continue
+            delay = policy.getRetryDelay(status=response.status)
+            if delay != None:
+                response.read()
+                self.releaseConnection(key, connection, response)
+                time.sleep(delay)
+                continue
+            return PooledResponse(self, key, connection, response)
+
+    def __getConnection(self, key):
+        # returns (connection, reused)
+        with self.lock:
+            connections = self.idleConnections.get(key)
+            if connections:
+                return connections.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.sslContext), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def releaseConnection(self, key, connection, response):
+        # keeps the connection for the next request if the response was read completely
+        if not response.isclosed() or response.will_close:
+            connection.close()
+            return
+        with self.lock:
+            connections = self.idleConnections.setdefault(key, [])
+            if len(connections) < self.maxConnections:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idleConnections.values():
+                for connection in connections:
+                    connection.close()
+            self.idleConnections = {}
+
+class PooledResponse(io.BufferedReader):
+
+    # buffered response stream which returns its connection to the pool when it is closed
+    max_drain_length = 64 * 1024
+
+    def __init__(self, pool, key, connection, response):
+        super().__init__(response)
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    @property
+    def length(self):
+        return self.response.length
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def close(self):
+        if not self.closed:
+            if not self.response.isclosed() and self.response.length != None and self.response.length <= PooledResponse.max_drain_length:
+                # read the small rest (e.g. the padding after a tar archive) to keep the connection
+                self.response.read()
+            self.pool.releaseConnection(self.key, self.connection, self.response)
+        super().close()
+
+class HttpCache:
+
+    # on-disk cache of downloaded files which revalidates them with conditional requests
+    # (If-None-Match / If-Modified-Since), on 304 the stored payload is returned
+    # parsed results are kept in memory with the validator of their response, so they are
+    # revalidated even if the file was only read partially (and therefore not stored)
+    max_results = 32
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+        self.results = {} # (url, key) -> (validator, value), in the order of their last use
+        self.lock = threading.Lock()
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def open(self, url):
+        # returns a readable stream of the current content of the url
+        return self.__open(url)[0]
+
+    def getParsed(self, url, parse, key=None):
+        # returns parse(stream) of the url content, the result is reused as long as the
+        # server reports the content as not modified, key distinguishes different parse calls
+        # (hashable, e.g. a tuple of the parse arguments)
+        # the result is shared by the calls of the same url and key and must not be modified, the callers
+        # copy or convert it before handing it out (e.g. with RadolanForecastArray.copy or toDict)
+        result = self.getResult(url, key)
+        stream, validator, notModified = self.__open(url, None if result == None else result[0])
+        if notModified and result != None and result[0] == validator:
+            if stream != None:
+                stream.close()
+            return result[1]
+        try:
+            value = parse(stream)
+        finally:
+            stream.close()
+        if validator != None:
+            self.putResult(url, key, validator, value)
+        return value
+
+    def getResult(self, url, key):
+        # returns (validator, value) of the parsed result or None, the value must not be modified
+        with self.lock:
+            result = self.results.pop((url, key), None)
+            if result != None:
+                self.results[(url, key)] = result
+            return result
+
+    def putResult(self, url, key, validator, value):
+        # keeps the parsed value (not a copy, it must not be modified), the least recently used results are dropped
+        with self.lock:
+            self.results.pop((url, key), None)
+            self.results[(url, key)] = (validator, value)
+            while len(self.results) > HttpCache.max_results:
+                del self.results[next(iter(self.results))]
+
+    def getStored(self, url):
+        # returns (validator, path) of the stored file of the url or None
+        dataPath, metaPath = self.__getPaths(url)
+        meta = self.__readMeta(dataPath, metaPath)
+        return None if meta == None else (HttpCache.__getValidator(meta), dataPath)
+
+    def store(self, url, validator, data):
+        # stores the completely downloaded content of the url
+        dataPath, metaPath = self.__getPaths(url)
+        tmpHandle, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+        with os.fdopen(tmpHandle, 'wb') as tmpFile:
+            tmpFile.write(data)
+        os.replace(tmpPath, dataPath)
+        HttpCache.writeMeta(metaPath, {'url' : url, 'etag' : validator[0], 'lastModified' : validator[1]})
+
+    @staticmethod
+    def writeMeta(metaPath, meta):
+        with open(metaPath + '.tmp', 'w') as metaFile:
+            json.dump(meta, metaFile)
+        os.replace(metaPath + '.tmp', metaPath)
+
+    @staticmethod
+    def getConditionalHeaders(validator):
+        # returns the request headers which revalidate the (etag, lastModified) validator (None: no headers)
+        headers = {}
+        if validator != None:
+            if validator[0] != None:
+                headers['If-None-Match'] = validator[0]
+            if validator[1] != None:
+                headers['If-Modified-Since'] = validator[1]
+        return headers
+
+    @staticmethod
+    def getResponseValidator(headers):
+        # returns (etag, lastModified) of the response headers or None if the response is not cacheable
+        validator = (headers.get('etag'), headers.get('last-modified'))
+        return None if validator == (None, None) else validator
+
+    def __open(self, url, validator=None):
+        # returns (stream, validator, notModified), validator - (etag, lastModified) of a parsed result
+        # which is revalidated instead of the stored file, on 304 the stream is None if the file is not stored
+        dataPath, metaPath = self.__getPaths(url)
+        meta = self.__readMeta(dataPath, metaPath)
+        if validator == None and meta != None:
+            validator = HttpCache.__getValidator(meta)
+        try:
+            response = DwdHttp.request(url, HttpCache.getConditionalHeaders(validator))
+        except HTTPError as error:
+            if error.code == 304 and validator != None:
+                error.close()
+                if meta != None and HttpCache.__getValidator(meta) == validator:
+                    return open(dataPath, 'rb'), validator, True
+                return None, validator, True
+            raise
+        validator = HttpCache.getResponseValidator(response.headers)
+        if validator == None:
+            return response, None, False # not cacheable
+        meta = {'url' : url, 'etag' : validator[0], 'lastModified' : validator[1]}
+        return io.BufferedReader(CachingStream(response, self.cacheDir, dataPath, metaPath, meta)), validator, False
+
+    def __readMeta(self, dataPath, metaPath):
+        if not os.path.exists(dataPath):
+            return None
+        try:
+            with open(metaPath) as metaFile:
+                return json.load(metaFile)
+        except (OSError, ValueError):
+            return None
+
+    def __getPaths(self, url):
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.cacheDir, name + '.data'), os.path.join(self.cacheDir, name + '.json')
+
+    @staticmethod
+    def __getValidator(meta):
+        return (meta.get('etag'), meta.get('lastModified'))
+
+class CachingStream(io.RawIOBase):
+
+    # passes the response through and stores it in the cache once it was read completely
+    max_drain_length = 1024 * 1024
+
+    def __init__(self, response, cacheDir, dataPath, metaPath, meta):
+        self.response = response
+        self.dataPath = dataPath
+        self.metaPath = metaPath
+        self.meta = meta
+        tmpHandle, self.tmpPath = tempfile.mkstemp(dir=cacheDir, suffix='.tmp')
+        self.tmpFile = os.fdopen(tmpHandle, 'wb')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = self.response.readinto(buffer)
+        if length > 0:
+            self.tmpFile.write(memoryview(buffer)[:length])
+        elif self.tmpFile != None:
+            self.__store()
+        return length
+
+    def __drain(self):
+        buffer = bytearray(64 * 1024)
+        while self.tmpFile != None:
+            self.readinto(buffer)
+
+    def __store(self):
+        self.tmpFile.close()
+        self.tmpFile = None
+        os.replace(self.tmpPath, self.dataPath)
+        HttpCache.writeMeta(self.metaPath, self.meta)
+
+    def close(self):
+        if not self.closed:
+            if self.tmpFile != None and self.response.length != None and self.response.length <= CachingStream.max_drain_length:
+                # e.g. the padding after the end of a tar archive
+                self.__drain()
+            self.response.close()
+            if self.tmpFile != None:
+                # not completely read -> not cached
+                self.tmpFile.close()
+                self.tmpFile = None
+                os.remove(self.tmpPath)
+        super().close()
+
+class DwdHttp:
+
+    # shared HTTP access of all product fetchers
+    cache = None
+    pool = HttpConnectionPool()
+
+    @staticmethod
+    def setPool(pool):
+        # pool - HttpConnectionPool used for all http(s) requests
+        DwdHttp.pool = pool
+
+    @staticmethod
+    def setCache(cache):
+        # cache - HttpCache to revalidate downloads with conditional requests or None to disable caching
+        DwdHttp.cache = cache
+
+    @staticmethod
+    def urlopen(url):
+        # url - url or an already opened binary stream (e.g. downloaded data in a BytesIO) which is returned as is
+        if not isinstance(url, str):
+            return url
+        if DwdHttp.cache != None and urlparse(url).scheme in ('http', 'https'):
+            return DwdHttp.cache.open(url)
+        return DwdHttp.request(url)
+
+    @staticmethod
+    def getParsed(url, parse, key=None):
+        # returns parse(stream) of the url (or the already opened stream), with a cache the result
+        # is reused until the content is modified, see HttpCache.getParsed
+        if DwdHttp.cache != None and isinstance(url, str) and urlparse(url).scheme in ('http', 'https'):
+            return DwdHttp.cache.getParsed(url, parse, key)
+        stream = DwdHttp.urlopen(url)
+        try:
+            return parse(stream)
+        finally:
+            stream.close()
+
+    @staticmethod
+    def request(url, headers=None, method='GET'):
+        # plain request without caching (e.g. HEAD or range requests)
+        if urlparse(url).scheme in ('http', 'https'):
+            return DwdHttp.pool.request(url, headers, method)
+        return urlopen(Request(url=url, headers=headers or {}, method=method))
+
+    @staticmethod
+    def getLastModified(url):
+        response = DwdHttp.request(url, method='HEAD')
+        try:
+            return response.getheader('last-modified')
+        finally:
+            response.close()
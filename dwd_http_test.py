@@ -0,0 +1,154 @@
+from dwd_http import DwdHttp, HttpCache, HttpConnectionPool
+from radolan import RadolanProducts
+from http_test_server import QuietRequestHandler, QuietHTTPServer
+import io
+from urllib.error import HTTPError
+import os
+import shutil
+import tempfile
+import time
+
+class CountingRequestHandler(QuietRequestHandler):
+
+    # SimpleHTTPRequestHandler answers If-Modified-Since with 304, the status codes are counted
+    protocol_version = 'HTTP/1.1' # keep-alive
+    statusCodes = []
+    clientPorts = []
+    # number of requests answered with 503
+    failures = 0
+    # close the connections after the response without announcing it (like an idle timeout of the server)
+    closeConnections = False
+
+    def do_GET(self):
+        CountingRequestHandler.clientPorts.append(self.client_address[1])
+        if CountingRequestHandler.failures > 0:
+            CountingRequestHandler.failures -= 1
+            self.send_error(503)
+        elif self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/small.bin')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            super().do_GET()
+        if CountingRequestHandler.closeConnections:
+            self.close_connection = True
+
+    def send_response(self, code, message=None):
+        CountingRequestHandler.statusCodes.append(code)
+        super().send_response(code, message)
+
+serverDir = tempfile.mkdtemp()
+cacheDir = tempfile.mkdtemp()
+server, baseUrl = QuietHTTPServer.start(CountingRequestHandler, serverDir)
+statusCodes = CountingRequestHandler.statusCodes
+
+def writeFile(name, data, age):
+    path = os.path.join(serverDir, name)
+    with open(path, 'wb') as file:
+        file.write(data)
+    os.utime(path, (time.time() - age, time.time() - age))
+
+# a completely read file is stored and revalidated
+cache = HttpCache(cacheDir)
+small = os.urandom(100000)
+writeFile('small.bin', small, 100)
+with cache.open(baseUrl + 'small.bin') as stream:
+    assert stream.read() == small
+with cache.open(baseUrl + 'small.bin') as stream:
+    assert stream.read() == small
+assert statusCodes == [200, 304]
+
+# a partially read file (larger than the drained rest) is not stored, its parsed result is revalidated
+large = os.urandom(3 * 1024 * 1024)
+writeFile('large.bin', large, 100)
+parseCalls = 0
+def parse(stream):
+    global parseCalls
+    parseCalls += 1
+    return [stream.read(10)]
+del statusCodes[:]
+assert cache.getParsed(baseUrl + 'large.bin', parse, 'head') == [large[:10]]
+value = cache.getParsed(baseUrl + 'large.bin', parse, 'head')
+assert value == [large[:10]] and parseCalls == 1
+# the result is shared, not copied
+assert cache.getParsed(baseUrl + 'large.bin', parse, 'head') is value
+assert statusCodes == [200, 304, 304]
+with cache.open(baseUrl + 'large.bin') as stream:
+    assert stream.read(10) == large[:10] # not stored -> 200
+assert statusCodes[-1] == 200
+# other keys are parsed separately
+assert cache.getParsed(baseUrl + 'large.bin', lambda stream: stream.read(5), 'other') == large[:5]
+assert parseCalls == 1
+
+# a modified file is parsed again
+large = os.urandom(3 * 1024 * 1024)
+writeFile('large.bin', large, 0)
+del statusCodes[:]
+assert cache.getParsed(baseUrl + 'large.bin', parse, 'head') == [large[:10]]
+assert statusCodes == [200] and parseCalls == 2
+
+# streams are parsed directly
+assert DwdHttp.getParsed(io.BytesIO(b'data'), lambda stream: stream.read()) == b'data'
+
+# the forecasts of a RADOLAN file are only read up to the requested one and reused on 304
+shutil.copy('testdata/DE1200_RV2506151820.tar.bz2', serverDir)
+os.utime(os.path.join(serverDir, 'DE1200_RV2506151820.tar.bz2'), (time.time() - 100, time.time() - 100))
+DwdHttp.setCache(cache)
+try:
+    del statusCodes[:]
+    xyxy = (100, 200, 102, 201)
+    data = RadolanProducts.getRvData(baseUrl + 'DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5])
+    assert data == RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5])
+    assert RadolanProducts.getRvData(baseUrl + 'DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5]) == data
+    # the callers get their own copies of the shared result
+    array = RadolanProducts.getRvData(baseUrl + 'DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5], columnar=True)
+    assert array.toDict() == data
+    array.values[:] = 0
+    data['forecasts'].clear()
+    assert RadolanProducts.getRvData(baseUrl + 'DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5], columnar=True).toDict() != array.toDict()
+    assert len(RadolanProducts.getRvData(baseUrl + 'DE1200_RV2506151820.tar.bz2', {xyxy}, forecastList=[0, 5])['forecasts']) == 2
+    assert statusCodes == [200, 304, 304, 304, 304]
+finally:
+    DwdHttp.setCache(None)
+
+# the connections are reused
+pool = HttpConnectionPool(backoff=5)
+clientPorts = CountingRequestHandler.clientPorts
+del clientPorts[:]
+for i in range(3):
+    with pool.request(baseUrl + 'small.bin') as response:
+        assert response.read() == small
+assert len(clientPorts) == 3 and len(set(clientPorts)) == 1
+# a connection closed by the server is replaced without backoff
+CountingRequestHandler.closeConnections = True
+start = time.time()
+for i in range(3):
+    with pool.request(baseUrl + 'small.bin') as response:
+        assert response.read() == small
+assert time.time() - start < 2
+assert len(set(clientPorts[3:])) == 3
+CountingRequestHandler.closeConnections = False
+# 5xx responses are retried with backoff
+pool = HttpConnectionPool(retries=2, backoff=0.1)
+CountingRequestHandler.failures = 2
+del statusCodes[:]
+start = time.time()
+with pool.request(baseUrl + 'small.bin') as response:
+    assert response.read() == small
+assert statusCodes == [503, 503, 200] and time.time() - start >= 0.3
+CountingRequestHandler.failures = 3
+try:
+    pool.request(baseUrl + 'small.bin')
+    assert False, 'HTTPError expected'
+except HTTPError as error:
+    assert error.code == 503
+# redirects are followed
+with pool.request(baseUrl + 'redirect') as response:
+    assert response.read() == small
+pool.close()
+
+server.shutdown()
+shutil.rmtree(serverDir)
+shutil.rmtree(cacheDir)
+print('dwd_http ok')
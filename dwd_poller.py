@@ -0,0 +1,166 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
+from dwd_http import DwdHttp
+from mosmix import MosmixData
+from radolan import RadolanProducts
+from radolan_hdf5 import RadolanHdf5Products
+
+class DwdPoller:
+
+    # watches the *_LATEST urls with conditional HEAD requests and calls the registered callbacks
+    # once per new run. After a new run the next check is scheduled for the expected publication
+    # of the following run, a late run is polled every minInterval for graceTime seconds and then
+    # with a growing interval (up to maxInterval and a quarter of the period of the url)
+
+    def __init__(self, minInterval=15, maxInterval=300, graceTime=120, callbackWorkers=4):
+        # callbackWorkers - threads of the started poller which call the callbacks, so slow callbacks
+        # (e.g. ingesting a run) do not delay the checks
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.graceTime = graceTime
+        self.callbackWorkers = callbackWorkers
+        self.watches = {}
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.thread = None
+        self.executor = None
+
+    def watch(self, url, callback, period=300, notifyCurrent=True):
+        # callback(url, lastModified) is called once per new content of the url
+        # period - publication interval of the url in seconds
+        # notifyCurrent - call the callback for the content available at the first check too
+        with self.lock:
+            watch = self.watches.get(url)
+            if watch == None:
+                watch = {'callbacks' : [], 'period' : period, 'etag' : None, 'lastModified' : None, 'modifiedTime' : None,
+                         'nextCheck' : 0, 'interval' : self.minInterval, 'notifyCurrent' : notifyCurrent}
+                self.watches[url] = watch
+            watch['callbacks'].append(callback)
+
+    def watchRadolanRv(self, callback, notifyCurrent=True):
+        self.watch(RadolanProducts.getLatestRvDataFileUrl(), callback, 300, notifyCurrent)
+
+    def watchRadolanHdf5Rv(self, callback, notifyCurrent=True):
+        self.watch(RadolanHdf5Products.getLatestRvDataFileUrl(), callback, 300, notifyCurrent)
+
+    def watchMosmix(self, callback, notifyCurrent=True):
+        self.watch(MosmixData.getMosmixFileUrl(), callback, 3600, notifyCurrent)
+
+    def start(self):
+        # starts the polling in a daemon thread, the callbacks are called by a thread pool
+        assert self.thread == None, 'poller already started'
+        self.stopEvent.clear()
+        self.executor = ThreadPoolExecutor(self.callbackWorkers, thread_name_prefix='DwdPollerCallback')
+        self.thread = threading.Thread(target=self.__run, name='DwdPoller', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # stops the polling and waits for the running callbacks
+        if self.thread != None:
+            self.stopEvent.set()
+            self.thread.join()
+            self.thread = None
+            self.executor.shutdown()
+            self.executor = None
+
+    def __run(self):
+        while not self.stopEvent.is_set():
+            self.stopEvent.wait(self.poll())
+
+    def poll(self):
+        # checks all urls which are due, returns the seconds until the next check
+        for url, watch in self.__getWatches():
+            if watch['nextCheck'] <= time.time():
+                self.check(url)
+        nextChecks = [watch['nextCheck'] for url, watch in self.__getWatches()]
+        if len(nextChecks) == 0:
+            return self.maxInterval
+        return max(0, min(nextChecks) - time.time())
+
+    def __getWatches(self):
+        with self.lock:
+            return list(self.watches.items())
+
+    def check(self, url):
+        # checks the url immediately, returns True if a new run was found, its callbacks are called
+        # by the thread pool of the started poller (otherwise before check returns)
+        watch = self.watches[url]
+        headers = {}
+        if watch['etag'] != None:
+            headers['If-None-Match'] = watch['etag']
+        if watch['lastModified'] != None:
+            headers['If-Modified-Since'] = watch['lastModified']
+        etag, lastModified = watch['etag'], watch['lastModified']
+        try:
+            response = DwdHttp.request(url, headers, 'HEAD')
+            response.close()
+            etag, lastModified = response.getheader('etag'), response.getheader('last-modified')
+        except HTTPError as error:
+            error.close()
+            if error.code != 304:
+                traceback.print_exc()
+        except OSError:
+            traceback.print_exc()
+        now = time.time()
+        modifiedTime = DwdPoller.__parseTime(lastModified, now)
+        isNew = (etag, lastModified) != (watch['etag'], watch['lastModified']) and \
+            (watch['modifiedTime'] == None or modifiedTime > watch['modifiedTime']) # no older content (e.g. of another server)
+        if not isNew:
+            if watch['modifiedTime'] != None and now < watch['modifiedTime'] + watch['period'] + self.graceTime:
+                # the run is usually published shortly after its expected time
+                watch['nextCheck'] = now + self.minInterval
+            else:
+                # the run is late (or the server not reachable): poll with a growing interval
+                watch['nextCheck'] = now + watch['interval']
+                watch['interval'] = min(watch['interval'] * 2, self.maxInterval, max(self.minInterval, watch['period'] / 4))
+            return False
+        isFirst = watch['modifiedTime'] == None
+        watch['etag'], watch['lastModified'], watch['modifiedTime'] = etag, lastModified, modifiedTime
+        watch['interval'] = self.minInterval
+        watch['nextCheck'] = max(modifiedTime + watch['period'], now + self.minInterval)
+        if isFirst and not watch['notifyCurrent']:
+            return False
+        executor = self.executor
+        if executor != None:
+            executor.submit(DwdPoller.__callCallbacks, url, lastModified, list(watch['callbacks']))
+        else:
+            DwdPoller.__callCallbacks(url, lastModified, list(watch['callbacks']))
+        return True
+
+    @staticmethod
+    def __callCallbacks(url, lastModified, callbacks):
+        for callback in callbacks:
+            try:
+                callback(url, lastModified)
+            except Exception:
+                # a failing callback must not stop the poller or trigger the run again
+                traceback.print_exc()
+
+    @staticmethod
+    def __parseTime(lastModified, default):
+        if lastModified == None:
+            return default
+        try:
+            return parsedate_to_datetime(lastModified).timestamp()
+        except (TypeError, ValueError):
+            return default
+
+
+if __name__ == "__main__":
+    #
+    # usage examples
+    #
+
+    # print the RV data of a point for every new RADOLAN run
+    from poi2RadolanRvMap import poi2RadolanRvMap
+    xy = poi2RadolanRvMap['70567']
+    poller = DwdPoller()
+    poller.watchRadolanRv(lambda url, lastModified: print(lastModified, RadolanProducts.getRvData(url, {(xy[0], xy[1], xy[0], xy[1])})))
+    poller.watchMosmix(lambda url, lastModified: print('new MOSMIX run', lastModified))
+    poller.start()
+    time.sleep(3600)
+    poller.stop()
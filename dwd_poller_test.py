@@ -0,0 +1,82 @@
+from dwd_poller import DwdPoller
+from http_test_server import QuietRequestHandler, QuietHTTPServer
+from threading import Event
+import os
+import shutil
+import tempfile
+import time
+
+serverDir = tempfile.mkdtemp()
+filePath = os.path.join(serverDir, 'DE1200_RV_LATEST.tar.bz2')
+with open(filePath, 'wb') as file:
+    file.write(b'run 1')
+os.utime(filePath, (1750000000, 1750000000))
+server, baseUrl = QuietHTTPServer.start(QuietRequestHandler, serverDir)
+url = baseUrl + 'DE1200_RV_LATEST.tar.bz2'
+
+runs = []
+poller = DwdPoller(minInterval=1, maxInterval=4)
+poller.watch(url, lambda url, lastModified: runs.append(lastModified))
+assert poller.check(url) == True
+assert poller.check(url) == False # unchanged -> 304
+assert runs == ['Sun, 15 Jun 2025 15:06:40 GMT']
+# new run
+os.utime(filePath, (1750000300, 1750000300))
+assert poller.check(url) == True
+assert poller.check(url) == False
+# older content is not reported again
+os.utime(filePath, (1750000000, 1750000000))
+assert poller.check(url) == False
+assert runs == ['Sun, 15 Jun 2025 15:06:40 GMT', 'Sun, 15 Jun 2025 15:11:40 GMT']
+
+# a late run is polled every minInterval during the grace time, then with an interval up to a quarter of the period
+poller = DwdPoller(minInterval=1, maxInterval=100, graceTime=60)
+now = time.time()
+os.utime(filePath, (now - 10, now - 10))
+poller.watch(url, lambda url, lastModified: None, period=8)
+assert poller.check(url) == True
+watch = poller.watches[url]
+assert watch['nextCheck'] <= time.time() + 1
+for i in range(3):
+    assert poller.check(url) == False
+    assert watch['nextCheck'] <= time.time() + 1
+os.utime(filePath, (now - 100, now - 100))
+poller = DwdPoller(minInterval=1, maxInterval=100, graceTime=60)
+poller.watch(url, lambda url, lastModified: None, period=8)
+assert poller.check(url) == True
+watch = poller.watches[url]
+for i in range(4):
+    assert poller.check(url) == False
+assert watch['interval'] == 2 and watch['nextCheck'] <= time.time() + 2
+
+# polling thread
+os.utime(filePath, (1750000300, 1750000300))
+poller = DwdPoller(minInterval=1, maxInterval=4)
+poller.watch(url, lambda url, lastModified: runs.append(lastModified))
+poller.check(url)
+fired = Event()
+os.utime(filePath, (1750000600, 1750000600))
+poller.watch(url, lambda url, lastModified: fired.set())
+poller.start()
+assert fired.wait(10)
+poller.stop()
+print(runs)
+assert runs[-1] == 'Sun, 15 Jun 2025 15:16:40 GMT'
+
+# a slow callback does not delay the checks of other urls
+otherPath = os.path.join(serverDir, 'composite_rv_LATEST.tar')
+with open(otherPath, 'wb') as file:
+    file.write(b'run 1')
+otherUrl = baseUrl + 'composite_rv_LATEST.tar'
+released = Event()
+fired = Event()
+poller = DwdPoller(minInterval=1, maxInterval=4)
+poller.watch(url, lambda url, lastModified: released.wait(10))
+poller.start()
+time.sleep(0.5)
+poller.watch(otherUrl, lambda url, lastModified: fired.set())
+assert fired.wait(5)
+released.set()
+poller.stop()
+server.shutdown()
+shutil.rmtree(serverDir)
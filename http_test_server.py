@@ -0,0 +1,23 @@
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from threading import Thread
+
+# local HTTP server of the tests
+
+class QuietRequestHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+class QuietHTTPServer(ThreadingHTTPServer):
+
+    # the clients close the connections of partially read files
+    def handle_error(self, request, client_address):
+        pass
+
+    @staticmethod
+    def start(handlerClass, directory):
+        # serves the directory with the handler class (e.g. a QuietRequestHandler subclass) in a daemon thread,
+        # returns the server and its base url
+        server = QuietHTTPServer(('127.0.0.1', 0), lambda *args: handlerClass(*args, directory=directory))
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server, 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
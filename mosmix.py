@@ -1,63 +1,152 @@
+import copy
 import re
 from math import cos, sqrt
-from urllib.request import urlopen, urlretrieve, Request
-from io import BytesIO
-from zipfile import ZipFile
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
-import tempfile
+import io
+import numpy
+from dwd_http import DwdHttp
+from zip_stream import ZipEntryStream
+
+class MosmixKmlScanner:
+
+    # byte level scanner of the MOSMIX kml file: the Placemarks of the not requested stations
+    # are skipped by searching their end tag, only the requested ones are parsed by ElementTree
+    chunk_size = 1024 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = b''
+        self.pos = 0
+        self.eof = False
+        self.__readHead()
+
+    def __readHead(self):
+        # reads everything up to the first Placemark: the time steps, the encoding and the namespace declarations
+        match = None
+        while match == None and not self.eof:
+            self.__readChunk()
+            match = re.search(rb'<([\w.-]+:)?Placemark[\s>]', self.buffer)
+        head = self.buffer if match == None else self.buffer[:match.start()]
+        prefix = b'' if match == None or match.group(1) == None else match.group(1)
+        self.placemarkStart = b'<' + prefix + b'Placemark'
+        self.placemarkEnd = b'</' + prefix + b'Placemark>'
+        self.nameStart = b'<' + prefix + b'name>'
+        self.nameEnd = b'</' + prefix + b'name>'
+        self.pos = len(head)
+        encoding = re.search(rb'<\?xml[^>]*encoding="([^"]+)"', head)
+        self.encoding = 'utf-8' if encoding == None else encoding.group(1).decode('ascii')
+        self.times = [time.decode(self.encoding) for time in re.findall(rb'<(?:[\w.-]+:)?TimeStep>([^<]*)<', head)]
+        rootTag = re.search(rb'<(?![?!])[^>]*>', head)
+        namespaces = b''.join(re.findall(rb'\sxmlns(?::[\w.-]+)?="[^"]*"', rootTag.group(0))) if rootTag != None else b''
+        # the requested Placemarks are parsed within a root element with the namespace declarations of the file
+        self.documentStart = b'<?xml version="1.0" encoding="' + self.encoding.encode('ascii') + b'"?><root' + namespaces + b'>'
+
+    def iterPlacemarks(self, stationIdList=None):
+        # yields (stationId, Placemark element) of the requested stations (all stations for None)
+        while True:
+            start = self.__find(self.placemarkStart, 0)
+            if start == -1:
+                return
+            self.pos += start # the positions below are relative to the start of the Placemark
+            nameStart = self.__find(self.nameStart, 0)
+            assert nameStart != -1, 'name of the Placemark is missing -> wrong file format'
+            nameEnd = self.__find(self.nameEnd, nameStart)
+            assert nameEnd != -1, 'end of the name is missing -> wrong file format'
+            end = self.__find(self.placemarkEnd, nameEnd)
+            assert end != -1, 'end of the Placemark is missing -> wrong file format'
+            end += len(self.placemarkEnd)
+            stationId = self.buffer[self.pos + nameStart + len(self.nameStart) : self.pos + nameEnd].decode(self.encoding)
+            if stationIdList == None or stationId in stationIdList:
+                root = ET.fromstring(self.documentStart + self.buffer[self.pos : self.pos + end] + b'</root>')
+                yield stationId, root[0]
+            self.pos += end
+
+    def __find(self, tag, offset):
+        # returns the position of the tag relative to self.pos (searched from offset), reads further chunks if needed
+        pos = self.pos + offset
+        while True:
+            index = self.buffer.find(tag, pos)
+            if index != -1:
+                return index - self.pos
+            if self.eof:
+                return -1
+            # continue the search in the overlap of the old and the new chunk
+            pos = max(pos, len(self.buffer) - len(tag) + 1)
+            pos -= self.__readChunk()
+
+    def __readChunk(self):
+        # appends the next chunk to the buffer and drops the consumed data,
+        # returns the number of dropped bytes (the positions in the buffer are moved by it)
+        chunk = self.stream.read(MosmixKmlScanner.chunk_size)
+        if len(chunk) == 0:
+            self.eof = True
+        dropped = self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return dropped
 
 class MosmixData:
 
+    # '-' marks a missing value
+    missing_value_pattern = re.compile(r'(?<!\S)-(?!\S)')
+
     @staticmethod
-    def __getMosmixFileUrl():
+    def getMosmixFileUrl():
         return "https://opendata.dwd.de/weather/local_forecasts/mos/MOSMIX_S/all_stations/kml/MOSMIX_S_LATEST_240.kmz"
 
     @staticmethod
     def getMosmixDataTimestamp():
-        return urlopen(Request(url=MosmixData.__getMosmixFileUrl(), method='HEAD')).getheader('last-modified')    
+        return DwdHttp.getLastModified(MosmixData.getMosmixFileUrl())
 
     @staticmethod
-    def getStationsDataByIds(stationIdList, elementNameList=None, hourList=None):
+    def getStationsDataByIds(stationIdList, elementNameList=None, hourList=None, numeric=False, dtype=numpy.float32):
         # print(stationIdList)
-        with tempfile.NamedTemporaryFile(prefix="mosmix_", mode='rb', delete=False) as localKmzFile:
-            # we need to store the kmz file locally as ZipFile needs random access to it
-            urlretrieve(MosmixData.__getMosmixFileUrl(), localKmzFile.name)
-
-            zf = ZipFile(localKmzFile)
-            file = zf.open(zf.namelist()[0])
-            context = ET.iterparse(file, events=("start", "end"))
-            ns_dwd = "{https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd}"
-            ns_kml = "{http://www.opengis.net/kml/2.2}"
-            stationsData = {}
-            for index, (event, elem) in enumerate(context):
-                # Get the root element.
-                if index == 0:
-                    root = elem
-                if event == "end":
-                    if elem.tag == ns_dwd + "ForecastTimeSteps":
-                        # print(elem.tag)
-                        times = elem.findall('./{*}TimeStep')
-                        #print(times)
-                        elem.clear()
-                    elif elem.tag == ns_kml + "Placemark":
-                        # print(elem.tag)
-                        stationId = elem.find('./{*}name').text
-                        # print(stationId)
-                        if stationId in stationIdList:
-                            stationsData[stationId] = MosmixData.__parsePlacemark(times, elem, elementNameList, hourList)
-                            # print(stationsData[stationId])
-                        elem.clear()
-                    root.clear()
-            # print(stationsData)
-            return stationsData
+        # with numeric=True the values are returned as arrays, see parseStationsData
+        # the kml file is inflated and parsed while the kmz file is being downloaded
+        def parse(kmzStream):
+            return MosmixData.parseStationsData(kmzStream, stationIdList, elementNameList, hourList, numeric, dtype)
+        if hourList != None:
+            # the hours are relative to the current time -> the result is not reused
+            with DwdHttp.urlopen(MosmixData.getMosmixFileUrl()) as kmzStream:
+                return parse(kmzStream)
+        key = ('getStationsDataByIds', frozenset(stationIdList), None if elementNameList == None else frozenset(elementNameList), numeric, numpy.dtype(dtype).str)
+        data = DwdHttp.getParsed(MosmixData.getMosmixFileUrl(), parse, key)
+        # a result of the HttpCache is shared, the copy of the requested stations costs little compared to the parsing
+        return data if DwdHttp.cache == None else copy.deepcopy(data)
+
+    @staticmethod
+    def parseStationsData(kmzFile, stationIdList, elementNameList=None, hourList=None, numeric=False, dtype=numpy.float32):
+        # kmzFile - binary stream of the kmz file, it is read sequentially and closed
+        # as soon as all requested stations are found
+        # numeric - return {'stationData', 'times', 'values': {elementName: (timesteps,) array}} per station
+        # instead of the values as strings per time step, '-' is returned as NaN
+        file = io.BufferedReader(ZipEntryStream(kmzFile), ZipEntryStream.chunk_size)
+        stationsData = {}
+        try:
+            scanner = MosmixKmlScanner(file)
+            missingIds = set(stationIdList)
+            if len(missingIds) > 0:
+                for stationId, placemark in scanner.iterPlacemarks(missingIds):
+                    if numeric:
+                        stationsData[stationId] = MosmixData.__parsePlacemarkArrays(scanner.times, placemark, elementNameList, hourList, dtype)
+                    else:
+                        stationsData[stationId] = MosmixData.__parsePlacemark(scanner.times, placemark, elementNameList, hourList)
+                    # print(stationsData[stationId])
+                    missingIds.discard(stationId)
+                    if len(missingIds) == 0:
+                        break # the rest of the file is not needed
+        finally:
+            file.close() # closes the zip member and the stream
+        # print(stationsData)
+        return stationsData
 
     @staticmethod
     def __parsePlacemark(times, placemark, elementNameList, hourList):
         timesArr = []
         for time in times:
-            timesArr.append({'time':time.text, 'values':{}})
-            # print(time.text)
+            timesArr.append({'time':time, 'values':{}})
+            # print(time)
 
         description = placemark.find('./{*}description').text
         # print(description.text)
@@ -86,18 +175,50 @@ class MosmixData:
             'forecasts' : timesArr,
         }
 
+    @staticmethod
+    def __parsePlacemarkArrays(times, placemark, elementNameList, hourList, dtype):
+        values = {}
+        for forecast in placemark.findall('./{*}ExtendedData/{*}Forecast'):
+            forecastName = forecast.attrib['{https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd}elementName']
+            if elementNameList == None or forecastName in elementNameList:
+                values[forecastName] = MosmixData.parseValues(forecast.find('./{*}value').text, dtype)
+
+        if hourList != None:
+            indexes = MosmixData.__getHourIndexes(hourList, times)
+            times = [times[i] for i in indexes]
+            values = {forecastName : forecastValues[indexes] for forecastName, forecastValues in values.items()}
+
+        lon, lat, elevation = placemark.find('./{*}Point/{*}coordinates').text.split(',')
+        return {
+            'stationData' : {'description':placemark.find('./{*}description').text, 'lat':lat, 'lon':lon, 'elevation':elevation},
+            'times' : times,
+            'values' : values,
+        }
+
+    @staticmethod
+    def parseValues(valueString, dtype=numpy.float64):
+        # converts the whitespace separated values of a dwd:value element into an array, '-' is converted to NaN
+        if '-' in valueString:
+            valueString = MosmixData.missing_value_pattern.sub('nan', valueString)
+        return numpy.fromstring(valueString, dtype=numpy.float64, sep=' ').astype(dtype, copy=False)
+
     @staticmethod
     def __filterHours(hourList, timesArr):
-        newArr = []
+        return [timesArr[i] for i in MosmixData.__getHourIndexes(hourList, [timeArrElem['time'] for timeArrElem in timesArr])]
+
+    @staticmethod
+    def __getHourIndexes(hourList, times):
+        # returns the indexes of the times which are the given hours in the future (in the order of hourList)
+        indexes = []
         nowHour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
         for hour in hourList:
-            def filterFunc(timeArrElem, desiredTime = nowHour + timedelta(hours=hour)):
-                dstr = timeArrElem['time']
+            desiredTime = nowHour + timedelta(hours=hour)
+            for i, dstr in enumerate(times):
                 time = datetime(int(dstr[:4]), int(dstr[5:7]), int(dstr[8:10]), int(dstr[11:13]), 0, 0, 0, timezone.utc)
                 # print(desiredTime, time)
-                return time == desiredTime
-            newArr.extend(filter(filterFunc, timesArr))
-        return newArr
+                if time == desiredTime:
+                    indexes.append(i)
+        return indexes
 
 
 
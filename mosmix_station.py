@@ -6,6 +6,7 @@ from zipfile import ZipFile
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
 import tempfile
+from dwd_http import DwdHttp
 
 class MosmixStation:
 
@@ -57,7 +58,7 @@ class StationList:
        return list(map(StationList.__convert_to_station, 
                     filter(StationList.__is_station, 
                         map(StationList.__convert_to_string,
-                            urlopen(StationList.station_list_url)))))
+                            DwdHttp.urlopen(StationList.station_list_url)))))
 
     def getNearestStation(self, lat, lon):
         distance = -1
@@ -0,0 +1,201 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import numpy
+from dwd_http import DwdHttp
+from mosmix import MosmixData, MosmixKmlScanner
+from zip_stream import ZipEntryStream
+
+class MosmixStore:
+
+    # columnar on-disk copy of a MOSMIX run (one sub directory per run):
+    # values.bin - float32 (stations, elements, timesteps) array, '-' is stored as NaN
+    # index.json - timestamp, time steps, element names and the stations with their station data
+    # an instance can be shared by threads, several instances (or processes) can use the same directory
+    index_file_name = 'index.json'
+    values_file_name = 'values.bin'
+    ns_dwd = '{https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd}'
+
+    def __init__(self, storeDir, maxAge=60, maxRuns=2):
+        # storeDir - directory of the stored runs
+        # maxAge - seconds for which the timestamp of the latest run is not requested again
+        # maxRuns - number of runs kept in the directory, the oldest are removed first
+        self.storeDir = storeDir
+        self.maxAge = maxAge
+        self.maxRuns = maxRuns
+        self.checked = None # (time of the check, run key)
+        self.openRun = None # (run key, index, values)
+        self.updateLock = threading.Lock() # guards checked, one update (download) per instance at a time
+        self.lock = threading.Lock() # guards openRun
+        os.makedirs(storeDir, exist_ok=True)
+
+    def update(self):
+        # stores the latest run unless it is already stored, returns its run key
+        with self.updateLock:
+            if self.checked != None and time.time() - self.checked[0] <= self.maxAge:
+                return self.checked[1]
+            return self.__update()
+
+    def __update(self):
+        timestamp = MosmixData.getMosmixDataTimestamp()
+        assert timestamp != None, 'timestamp of the MOSMIX file is missing'
+        runKey = MosmixStore.getRunKey(timestamp)
+        if not self.__isStored(runKey):
+            with DwdHttp.request(MosmixData.getMosmixFileUrl()) as kmzStream:
+                # a new run may have been published since the HEAD request -> the key of the downloaded file
+                timestamp = kmzStream.getheader('last-modified')
+                assert timestamp != None, 'timestamp of the MOSMIX file is missing'
+                runKey = MosmixStore.getRunKey(timestamp)
+                if not self.__isStored(runKey):
+                    self.ingest(kmzStream, runKey, timestamp)
+            self.__removeOldRuns()
+        self.checked = (time.time(), runKey)
+        return runKey
+
+    @staticmethod
+    def getRunKey(timestamp):
+        # returns the run key (name of the run directory) of the Last-Modified timestamp of the MOSMIX file
+        return 'mosmix_' + parsedate_to_datetime(timestamp).strftime('%Y%m%d%H%M%S')
+
+    def __isStored(self, runKey):
+        return os.path.exists(os.path.join(self.storeDir, runKey, MosmixStore.index_file_name))
+
+    def ingest(self, kmzFile, runKey, timestamp=None):
+        # converts the kmz file (binary stream, read sequentially) into the run directory runKey
+        # unique per process and thread, other threads or instances may store the same run meanwhile
+        tmpDir = tempfile.mkdtemp(prefix=runKey + '.tmp', dir=self.storeDir)
+        try:
+            with io.BufferedReader(ZipEntryStream(kmzFile), ZipEntryStream.chunk_size) as file:
+                scanner = MosmixKmlScanner(file)
+                stations = []
+                stationElements = []
+                elements = []
+                with open(os.path.join(tmpDir, MosmixStore.values_file_name + '.tmp'), 'wb') as valuesFile:
+                    for stationId, placemark in scanner.iterPlacemarks():
+                        stationData, forecasts = MosmixStore.__readPlacemark(placemark)
+                        stations.append({'id' : stationId, 'stationData' : stationData})
+                        names = list(forecasts.keys())
+                        stationElements.append(names)
+                        elements.extend(name for name in names if name not in elements)
+                        block = numpy.full((len(names), len(scanner.times)), numpy.nan, dtype=numpy.float32)
+                        for row, name in enumerate(names):
+                            values = MosmixData.parseValues(forecasts[name], numpy.float32)
+                            block[row, : len(values)] = values[: len(scanner.times)]
+                        valuesFile.write(block.tobytes())
+            MosmixStore.__storeValues(tmpDir, stationElements, elements, len(scanner.times))
+            with open(os.path.join(tmpDir, MosmixStore.index_file_name), 'w') as indexFile:
+                json.dump({'timestamp' : timestamp, 'times' : scanner.times, 'elements' : elements, 'stations' : stations}, indexFile)
+            runDir = os.path.join(self.storeDir, runKey)
+            if not self.__isStored(runKey): # not stored by another thread or process meanwhile
+                shutil.rmtree(runDir, ignore_errors=True)
+                try:
+                    os.rename(tmpDir, runDir)
+                except OSError:
+                    if not self.__isStored(runKey):
+                        raise
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+    @staticmethod
+    def __storeValues(tmpDir, stationElements, elements, timeSteps):
+        # the stations were written with their own elements, usually these are the same for all stations
+        tmpPath = os.path.join(tmpDir, MosmixStore.values_file_name + '.tmp')
+        valuesPath = os.path.join(tmpDir, MosmixStore.values_file_name)
+        if all(names == elements for names in stationElements):
+            os.rename(tmpPath, valuesPath)
+            return
+        values = numpy.memmap(valuesPath, dtype=numpy.float32, mode='w+', shape=(len(stationElements), len(elements), timeSteps))
+        values[:] = numpy.nan
+        with open(tmpPath, 'rb') as tmpFile:
+            for station, names in enumerate(stationElements):
+                block = numpy.fromfile(tmpFile, dtype=numpy.float32, count=len(names) * timeSteps).reshape(len(names), timeSteps)
+                values[station, [elements.index(name) for name in names]] = block
+        values.flush()
+        del values
+        os.remove(tmpPath)
+
+    @staticmethod
+    def __readPlacemark(placemark):
+        # returns (stationData, {elementName: value string})
+        lon, lat, elevation = placemark.find('./{*}Point/{*}coordinates').text.split(',')
+        stationData = {'description' : placemark.find('./{*}description').text, 'lat' : lat, 'lon' : lon, 'elevation' : elevation}
+        forecasts = {}
+        for forecast in placemark.findall('./{*}ExtendedData/{*}Forecast'):
+            forecasts[forecast.attrib[MosmixStore.ns_dwd + 'elementName']] = forecast.find('./{*}value').text
+        return stationData, forecasts
+
+    def __removeOldRuns(self):
+        runs = []
+        for runKey in os.listdir(self.storeDir):
+            runDir = os.path.join(self.storeDir, runKey)
+            if '.tmp' in runKey or not os.path.isdir(runDir):
+                continue
+            runs.append((os.stat(runDir).st_mtime, runKey))
+        for mtime, runKey in sorted(runs)[: max(0, len(runs) - self.maxRuns)]:
+            with self.lock:
+                if self.openRun != None and self.openRun[0] == runKey:
+                    self.openRun = None
+            shutil.rmtree(os.path.join(self.storeDir, runKey), ignore_errors=True)
+
+    def open(self, runKey=None):
+        # returns (index, values) of the run (default: the latest), values is the read only memory mapped
+        # (stations, elements, timesteps) array, index['stationIndex'] maps the station id to the first axis
+        if runKey == None:
+            runKey = self.update()
+        with self.lock:
+            openRun = self.openRun
+        if openRun != None and openRun[0] == runKey:
+            return openRun[1], openRun[2]
+        runDir = os.path.join(self.storeDir, runKey)
+        with open(os.path.join(runDir, MosmixStore.index_file_name)) as indexFile:
+            index = json.load(indexFile)
+        index['stationIndex'] = {station['id'] : position for position, station in enumerate(index['stations'])}
+        index['elementIndex'] = {name : position for position, name in enumerate(index['elements'])}
+        shape = (len(index['stations']), len(index['elements']), len(index['times']))
+        if shape[0] * shape[1] * shape[2] == 0:
+            values = numpy.empty(shape, dtype=numpy.float32)
+        else:
+            values = numpy.memmap(os.path.join(runDir, MosmixStore.values_file_name), dtype=numpy.float32, mode='r', shape=shape)
+        with self.lock:
+            self.openRun = (runKey, index, values)
+        return index, values
+
+    def getValues(self, stationId, elementName, runKey=None):
+        # returns the (timesteps,) float32 array of the element of the station, missing values are NaN
+        index, values = self.open(runKey)
+        assert stationId in index['stationIndex'], 'station ' + str(stationId) + ' is not available'
+        assert elementName in index['elementIndex'], 'element ' + str(elementName) + ' is not available'
+        return values[index['stationIndex'][stationId], index['elementIndex'][elementName]]
+
+    def getStationsData(self, stationIdList, elementNameList=None, runKey=None):
+        # returns {stationId: {'stationData': {...}, 'times': [...], 'values': {elementName: (timesteps,) array}}}
+        # of the available stations
+        index, values = self.open(runKey)
+        elementNames = index['elements'] if elementNameList == None else [name for name in index['elements'] if name in elementNameList]
+        stationsData = {}
+        for stationId in stationIdList:
+            position = index['stationIndex'].get(stationId)
+            if position != None:
+                stationsData[stationId] = {
+                    'stationData' : index['stations'][position]['stationData'],
+                    'times' : index['times'],
+                    'values' : {name : values[position, index['elementIndex'][name]] for name in elementNames}
+                }
+        return stationsData
+
+
+if __name__ == "__main__":
+    #
+    # usage examples
+    #
+
+    # the run is downloaded once and then read from the store until a new run is published
+    from poi2MosmixMap import poi2MosmixMap
+    store = MosmixStore('./mosmix_store')
+    print(store.getStationsData({poi2MosmixMap['70567'], poi2MosmixMap['10555']}, {'TTT', 'FF'}))
+    print(store.getValues(poi2MosmixMap['70567'], 'TTT'))
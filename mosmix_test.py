@@ -0,0 +1,144 @@
+from mosmix import MosmixData
+from zipfile import ZipFile, ZIP_DEFLATED
+import io
+import numpy
+
+# synthetic kmz file in the format of MOSMIX_S_LATEST_240.kmz
+def createKml(stations):
+    kml = ['<?xml version="1.0" encoding="ISO-8859-1" standalone="yes"?>',
+           '<kml:kml xmlns:dwd="https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd" xmlns:kml="http://www.opengis.net/kml/2.2">',
+           '<kml:Document><kml:ExtendedData><dwd:ProductDefinition><dwd:IssueTime>2025-06-15T18:00:00.000Z</dwd:IssueTime>',
+           '<dwd:ForecastTimeSteps><dwd:TimeStep>2025-06-15T19:00:00.000Z</dwd:TimeStep><dwd:TimeStep>2025-06-15T20:00:00.000Z</dwd:TimeStep>'
+           '<dwd:TimeStep>2025-06-15T21:00:00.000Z</dwd:TimeStep></dwd:ForecastTimeSteps></dwd:ProductDefinition></kml:ExtendedData>']
+    for stationId, description, values in stations:
+        kml.append('<kml:Placemark><kml:name>' + stationId + '</kml:name><kml:description>' + description + '</kml:description><kml:ExtendedData>')
+        for elementName, value in values.items():
+            kml.append('<dwd:Forecast dwd:elementName="' + elementName + '"><dwd:value>     ' + value + '</dwd:value></dwd:Forecast>')
+        kml.append('</kml:ExtendedData><kml:Point><kml:coordinates>13.31,52.56,36.0</kml:coordinates></kml:Point></kml:Placemark>')
+    kml.append('</kml:Document></kml:kml>')
+    return '\n'.join(kml).encode('iso-8859-1')
+
+class WriteOnlyStream(io.RawIOBase):
+
+    # not seekable -> the zip entry is written with a data descriptor like the DWD files
+    def __init__(self, target):
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.target.write(data)
+
+stations = [('10382', 'BERLIN-TEGEL', {'TTT' : '291.45     290.65     289.85', 'FF' : '3.60     -     2.57'}),
+            ('P0001', 'TEST', {'TTT' : '280.00     281.00     282.00', 'FF' : '1.00     1.50     2.00'}),
+            ('10384', 'BERLIN-TEMPELHOF', {'TTT' : '292.05     291.15     290.25', 'FF' : '3.09     3.09     2.06'})]
+kmzBytes = io.BytesIO()
+with ZipFile(WriteOnlyStream(kmzBytes), 'w', ZIP_DEFLATED) as zf:
+    with zf.open('MOSMIX_S_2025061518_240.kml', 'w') as kmlFile:
+        kmlFile.write(createKml(stations))
+kmz = kmzBytes.getvalue()
+
+data = MosmixData.parseStationsData(io.BytesIO(kmz), {'10382', 'P0001'}, {'TTT', 'FF'})
+print(data)
+assert data == {
+    '10382': {'stationData': {'description': 'BERLIN-TEGEL', 'lat': '52.56', 'lon': '13.31', 'elevation': '36.0'},
+              'forecasts': [{'time': '2025-06-15T19:00:00.000Z', 'values': {'TTT': '291.45', 'FF': '3.60'}},
+                            {'time': '2025-06-15T20:00:00.000Z', 'values': {'TTT': '290.65', 'FF': '-'}},
+                            {'time': '2025-06-15T21:00:00.000Z', 'values': {'TTT': '289.85', 'FF': '2.57'}}]},
+    'P0001': {'stationData': {'description': 'TEST', 'lat': '52.56', 'lon': '13.31', 'elevation': '36.0'},
+              'forecasts': [{'time': '2025-06-15T19:00:00.000Z', 'values': {'TTT': '280.00', 'FF': '1.00'}},
+                            {'time': '2025-06-15T20:00:00.000Z', 'values': {'TTT': '281.00', 'FF': '1.50'}},
+                            {'time': '2025-06-15T21:00:00.000Z', 'values': {'TTT': '282.00', 'FF': '2.00'}}]}}
+assert MosmixData.parseStationsData(io.BytesIO(kmz), {'10384'}, {'FF'})['10384']['forecasts'][2] == {'time': '2025-06-15T21:00:00.000Z', 'values': {'FF': '2.06'}}
+
+# values as arrays
+numericData = MosmixData.parseStationsData(io.BytesIO(kmz), {'10382'}, {'FF'}, numeric=True)
+assert numericData['10382']['times'] == ['2025-06-15T19:00:00.000Z', '2025-06-15T20:00:00.000Z', '2025-06-15T21:00:00.000Z']
+assert numericData['10382']['values']['FF'].dtype == numpy.float32
+assert numpy.array_equal(numericData['10382']['values']['FF'], numpy.array([3.6, numpy.nan, 2.57], dtype=numpy.float32), equal_nan=True)
+assert numpy.array_equal(MosmixData.parseValues(' -1.5  -\n  - 2e1 -'), [-1.5, numpy.nan, numpy.nan, 20, numpy.nan], equal_nan=True)
+
+# tags split over the chunks of the scanner
+from mosmix import MosmixKmlScanner
+chunkSize = MosmixKmlScanner.chunk_size
+MosmixKmlScanner.chunk_size = 7
+assert MosmixData.parseStationsData(io.BytesIO(kmz), {'10382', 'P0001'}, {'TTT', 'FF'}) == data
+MosmixKmlScanner.chunk_size = chunkSize
+
+# the stream is closed as soon as all requested stations are found
+from zip_stream import ZipEntryStream
+class CountingStream(io.BytesIO):
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytesRead = self.tell()
+        return data
+
+zipChunkSize = ZipEntryStream.chunk_size
+ZipEntryStream.chunk_size = 16
+MosmixKmlScanner.chunk_size = 16
+kmzStream = CountingStream(kmz)
+assert list(MosmixData.parseStationsData(kmzStream, ['10382'], {'TTT'}).keys()) == ['10382']
+assert kmzStream.closed and kmzStream.bytesRead < len(kmz)
+ZipEntryStream.chunk_size = zipChunkSize
+MosmixKmlScanner.chunk_size = chunkSize
+
+# columnar store, rebuilt only for a new run
+from mosmix_store import MosmixStore
+from http_test_server import QuietRequestHandler, QuietHTTPServer
+import math
+import os
+import shutil
+import tempfile
+
+class RunRequestHandler(QuietRequestHandler):
+
+    # modification time of the file set after the next HEAD request (a run published between HEAD and GET)
+    nextModifiedTime = None
+
+    def do_HEAD(self):
+        super().do_HEAD()
+        if RunRequestHandler.nextModifiedTime != None:
+            os.utime(os.path.join(serverDir, 'MOSMIX_S_LATEST_240.kmz'), (RunRequestHandler.nextModifiedTime, RunRequestHandler.nextModifiedTime))
+            RunRequestHandler.nextModifiedTime = None
+
+serverDir = tempfile.mkdtemp()
+with open(os.path.join(serverDir, 'MOSMIX_S_LATEST_240.kmz'), 'wb') as kmzFile:
+    kmzFile.write(kmz)
+server, baseUrl = QuietHTTPServer.start(RunRequestHandler, serverDir)
+getMosmixFileUrl = MosmixData.getMosmixFileUrl
+MosmixData.getMosmixFileUrl = staticmethod(lambda: baseUrl + 'MOSMIX_S_LATEST_240.kmz')
+store = MosmixStore(tempfile.mkdtemp(), maxAge=0)
+runKey = store.update()
+assert store.update() == runKey and len(os.listdir(store.storeDir)) == 1
+values = store.getValues('10382', 'FF')
+assert values.tolist()[0] == numpy.float32(3.6) and math.isnan(values[1]) and values.tolist()[2] == numpy.float32(2.57)
+stationsData = store.getStationsData(['P0001', 'unknown'], {'TTT'})
+assert list(stationsData.keys()) == ['P0001'] and stationsData['P0001']['values']['TTT'].tolist() == [280.0, 281.0, 282.0]
+assert stationsData['P0001']['times'] == ['2025-06-15T19:00:00.000Z', '2025-06-15T20:00:00.000Z', '2025-06-15T21:00:00.000Z']
+os.utime(os.path.join(serverDir, 'MOSMIX_S_LATEST_240.kmz'), (1750100000, 1750100000))
+assert store.update() != runKey
+# the run key is taken from the downloaded file
+os.utime(os.path.join(serverDir, 'MOSMIX_S_LATEST_240.kmz'), (1750150000, 1750150000))
+RunRequestHandler.nextModifiedTime = 1750200000
+runKey = store.update()
+assert runKey == MosmixStore.getRunKey('Tue, 17 Jun 2025 22:40:00 GMT') == 'mosmix_20250617224000'
+assert store.open(runKey)[0]['timestamp'] == 'Tue, 17 Jun 2025 22:40:00 GMT'
+# asyncio: downloaded on the event loop, parsed by the executor
+from dwd_async import AsyncMosmixData
+import asyncio
+assert asyncio.run(AsyncMosmixData.getStationsDataByIds({'10382', 'P0001'}, {'TTT', 'FF'})) == data
+server.shutdown()
+MosmixData.getMosmixFileUrl = staticmethod(getMosmixFileUrl)
+shutil.rmtree(serverDir)
+shutil.rmtree(store.storeDir)
+
+# the same run stored concurrently by several instances (or threads)
+from concurrent.futures import ThreadPoolExecutor
+storeDir = tempfile.mkdtemp()
+with ThreadPoolExecutor(4) as executor:
+    list(executor.map(lambda i: MosmixStore(storeDir).ingest(io.BytesIO(kmz), 'mosmix_20250615180000'), range(4)))
+assert os.listdir(storeDir) == ['mosmix_20250615180000']
+assert MosmixStore(storeDir).getValues('P0001', 'TTT', 'mosmix_20250615180000').tolist() == [280.0, 281.0, 282.0]
+shutil.rmtree(storeDir)
@@ -1,10 +1,19 @@
 from math import sin, cos, radians, ceil
+import io
+import queue
 import tarfile
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from radolan_forecast_array import RadolanForecastArray
+from radolan_forecast import RadolanForecastFilter, RadolanBoxes
+from bz2_parallel import ParallelBz2, ChunkStream
+from shared_payload import SharedPayload, SharedDecoding
+from dwd_http import DwdHttp
 class RadolanFile:
 
     header_length = 91
+    nodata_value = 0x29C4
 
     @staticmethod
     def readHeader(stream):
@@ -55,7 +64,7 @@ class RadolanFile:
         return pow(10, int(precision[1:4]))
 
     @staticmethod
-    def readValues(header, stream, xyxyTupleSet, callback):
+    def __checkBoxes(header, xyxyTupleSet):
         header_x = header['dimension']['x']
         header_y = header['dimension']['y']
         for x0, y0, x1, y1 in xyxyTupleSet:
@@ -63,30 +72,264 @@ class RadolanFile:
             assert y0 < header_y, "y0 (" + str(y0)  + ") shall be lesser than " + str(header_y)
             assert x1 < header_x, "x1 (" + str(x1) + ") shall be lesser than " + str(header_x)
             assert y1 < header_y, "y1 (" + str(y1)  + ") shall be lesser than " + str(header_y)
+
+    @staticmethod
+    def readValues(header, stream, xyxyTupleSet, callback):
+        RadolanFile.__checkBoxes(header, xyxyTupleSet)
+        header_x = header['dimension']['x']
+        header_y = header['dimension']['y']
+        rowSpans = RadolanFile.buildRowSpans(xyxyTupleSet)
+        precision = header['precision']
         dataRow = bytearray(header_x * 2)
         for curY in range(header_y):
             assert stream.readinto(dataRow) == len(dataRow), 'file too short'
             # print(dataRow, '\n')
-            for curX in range(header_x):
-                for x0, y0, x1, y1 in xyxyTupleSet:
-                    if curX >= x0 and curY >= y0 and curX <= x1 and curY <= y1:
-                        valBytes = dataRow[curX * 2 : curX * 2 + 2]
-                        # print(valBytes)
-                        if valBytes == b'\xc4\x29':
-                            value = -1
-                        else:
-                            value= float(int.from_bytes(valBytes, 'little')) * header['precision']
-                        callback((curX, curY), value)
+            spans = rowSpans.get(curY)
+            if spans == None:
+                continue # row outside of all boxes
+            for x0, x1 in spans:
+                for curX in range(x0, x1 + 1):
+                    valBytes = dataRow[curX * 2 : curX * 2 + 2]
+                    # print(valBytes)
+                    if valBytes == b'\xc4\x29':
+                        value = -1
+                    else:
+                        value= float(int.from_bytes(valBytes, 'little')) * precision
+                    callback((curX, curY), value)
+
+    @staticmethod
+    def readBoxes(header, stream, xyxyTupleSet, callback):
+        # reads the rows covered by the boxes at once and calls the callback
+        # once per box with the decoded (y1-y0+1, x1-x0+1) array, nodata values are NaN
+        RadolanFile.__checkBoxes(header, xyxyTupleSet)
+        header_x = header['dimension']['x']
+        header_y = header['dimension']['y']
+        if len(xyxyTupleSet) == 0:
+            minY, maxY = header_y, header_y - 1
+        else:
+            minY = min(box[1] for box in xyxyTupleSet)
+            maxY = max(box[3] for box in xyxyTupleSet)
+        rowLength = header_x * 2
+        assert len(stream.read(minY * rowLength)) == minY * rowLength, 'file too short'
+        dataBytes = stream.read((maxY - minY + 1) * rowLength)
+        assert len(dataBytes) == (maxY - minY + 1) * rowLength, 'file too short'
+        rows = numpy.frombuffer(dataBytes, dtype='<u2').reshape(maxY - minY + 1, header_x)
+        RadolanFile.__decodeBoxes(header, rows, minY, xyxyTupleSet, callback)
+        restLength = (header_y - maxY - 1) * rowLength
+        assert len(stream.read(restLength)) == restLength, 'file too short'
+
+    @staticmethod
+    def readRawGridBoxes(header, rawGrid, xyxyTupleSet, callback):
+        # same as readBoxes but for an already loaded (y, x) array (e.g. memory mapped) of the raw values
+        RadolanFile.__checkBoxes(header, xyxyTupleSet)
+        RadolanFile.__decodeBoxes(header, rawGrid, 0, xyxyTupleSet, callback)
+
+    @staticmethod
+    def __decodeBoxes(header, rows, minY, xyxyTupleSet, callback):
+        for xyxyTuple in xyxyTupleSet:
+            x0, y0, x1, y1 = xyxyTuple
+            callback(xyxyTuple, RadolanFile.decodeGrid(header, rows[y0 - minY : y1 - minY + 1, x0 : x1 + 1]))
+
+    @staticmethod
+    def buildRowSpans(xyxyTupleSet):
+        # returns {y: [(x0, x1), ...]} with the sorted and merged x spans of all boxes covering row y
+        rowSpans = {}
+        for x0, y0, x1, y1 in xyxyTupleSet:
+            for y in range(y0, y1 + 1):
+                rowSpans.setdefault(y, []).append((x0, x1))
+        for y, spans in rowSpans.items():
+            spans.sort()
+            merged = [spans[0]]
+            for x0, x1 in spans[1:]:
+                lastX0, lastX1 = merged[-1]
+                if x0 <= lastX1 + 1:
+                    merged[-1] = (lastX0, max(lastX1, x1))
+                else:
+                    merged.append((x0, x1))
+            rowSpans[y] = merged
+        return rowSpans
+
+    @staticmethod
+    def readGrid(header, stream):
+        # reads the whole payload at once and returns the decoded values as (y, x) array
+        # the nodata values are returned as NaN
+        header_x = header['dimension']['x']
+        header_y = header['dimension']['y']
+        dataBytes = stream.read(header_x * header_y * 2)
+        assert len(dataBytes) == header_x * header_y * 2, 'file too short'
+        return RadolanFile.decodeGrid(header, numpy.frombuffer(dataBytes, dtype='<u2').reshape(header_y, header_x))
+
+    @staticmethod
+    def decodeGrid(header, rawGrid):
+        grid = rawGrid.astype(numpy.float64) * header['precision']
+        grid[rawGrid == RadolanFile.nodata_value] = numpy.nan
+        return grid
+
+    @staticmethod
+    def submitBoxes(executor, header, stream, xyxyTupleSet, arrayLambda=None):
+        # copies the payload (stream is positioned after the header) into shared memory and returns
+        # the SharedDecoding of its boxes by the executor (e.g. a ProcessPoolExecutor)
+        payload = SharedPayload.copyFrom(stream, header['dimension']['x'] * header['dimension']['y'] * 2)
+        return SharedDecoding(executor, RadolanFile.decodeSharedBoxes, payload, xyxyTupleSet, arrayLambda, (header,))
+
+    @staticmethod
+    def decodeSharedBoxes(payloadPath, boxesPath, xyxyList, header):
+        # runs in the executor, see SharedDecoding
+        rawGrid = numpy.memmap(payloadPath, dtype='<u2', mode='r', shape=(header['dimension']['y'], header['dimension']['x']))
+        boxValues = []
+        RadolanFile.readRawGridBoxes(header, rawGrid, xyxyList, lambda xyxyTuple, values: boxValues.append(values))
+        SharedPayload.writeBoxes(boxesPath, boxValues)
+        return header
 
 class RadolanBzipFile:
 
     @staticmethod
-    def getFileStreams(bzStream):
-        tf = tarfile.open(fileobj=bzStream, mode="r|bz2")
-        for tarInfo in tf:
-            if tarInfo.isfile():
-                # print("yeld", tarInfo.name)
-                yield [tarInfo.name, tf.extractfile(tarInfo) ]
+    def getFileStreams(bzStream, workers=None):
+        # with workers != None the bzip2 blocks are decompressed in parallel by a process pool
+        if workers == None:
+            tarStream = bzStream
+            tf = tarfile.open(fileobj=tarStream, mode="r|bz2")
+        else:
+            tarStream = ParallelBz2.open(bzStream, workers)
+            tf = tarfile.open(fileobj=tarStream, mode="r|")
+        try:
+            for tarInfo in tf:
+                if tarInfo.isfile():
+                    # print("yeld", tarInfo.name)
+                    yield [tarInfo.name, tf.extractfile(tarInfo) ]
+        finally:
+            tf.close()
+            if tarStream != bzStream:
+                tarStream.close()
+
+    @staticmethod
+    def getRequestedFileStreams(bzStream, forecastFilter, workers=None):
+        # yields [header, fileStream] of the forecasts requested by the RadolanForecastFilter, fileStream is
+        # positioned after the header, the archive is not read further than the last requested forecast
+        fileStreams = RadolanBzipFile.getFileStreams(bzStream, workers)
+        try:
+            for fileName, fileStream in fileStreams:
+                # print(fileName)
+                header = RadolanFile.readHeader(fileStream)
+                # print(header)
+                if forecastFilter.isAfterLast(header['forecast']):
+                    break
+                if forecastFilter.isRequested(header['forecast']):
+                    yield [header, fileStream]
+                fileStream.close()
+                if forecastFilter.isLast(header['forecast']):
+                    break
+        finally:
+            fileStreams.close()
+
+class RadolanPipeline:
+
+    # overlaps download, decompression and decoding of a run:
+    # reader thread (stream -> bounded chunk queue) -> tar thread (bz2 + tar -> bounded member queue)
+    # -> decode threads, the results are returned in the order of the members (forecasts)
+
+    def __init__(self, decodeWorkers=2, chunkSize=256 * 1024, maxChunks=16, maxMembers=4):
+        # decodeWorkers - threads decoding the members
+        # maxChunks - downloaded chunks (of chunkSize bytes) buffered ahead of the decompression
+        # maxMembers - decompressed members buffered ahead of the consumer
+        self.decodeWorkers = decodeWorkers
+        self.chunkSize = chunkSize
+        self.maxChunks = maxChunks
+        self.maxMembers = maxMembers
+
+    def iterBoxes(self, bzStream, xyxyTupleSet, arrayLambda, bz2Workers, forecastFilter, decodeExecutor=None):
+        # yields (header, [(xyxyTuple, values), ...]) like RadolanProducts.iterRadolanForecastBoxes
+        # with a decodeExecutor the members are decoded by it (see SharedDecoding) instead of the own threads
+        chunkQueue = queue.Queue(self.maxChunks)
+        memberQueue = queue.Queue(self.maxMembers)
+        stopEvent = threading.Event()
+        readStopEvent = threading.Event()
+        executor = ThreadPoolExecutor(self.decodeWorkers) if decodeExecutor == None else None
+        threads = [threading.Thread(target=self.__read, args=(bzStream, chunkQueue, readStopEvent), daemon=True),
+                   threading.Thread(target=self.__untar, args=(chunkQueue, memberQueue, stopEvent, readStopEvent, executor,
+                                    decodeExecutor, xyxyTupleSet, arrayLambda, bz2Workers, forecastFilter), daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            for future in RadolanPipeline.__iterQueue(memberQueue):
+                yield future.result()
+        finally:
+            stopEvent.set()
+            readStopEvent.set()
+            for thread in threads:
+                thread.join()
+            while not memberQueue.empty():
+                task = memberQueue.get_nowait()
+                if task != None and not isinstance(task, Exception):
+                    task.cancel()
+            if executor != None:
+                executor.shutdown()
+
+    def __read(self, bzStream, chunkQueue, stopEvent):
+        try:
+            while True:
+                chunk = bzStream.read(self.chunkSize)
+                if not RadolanPipeline.__put(chunkQueue, chunk if len(chunk) > 0 else None, stopEvent) or len(chunk) == 0:
+                    return
+        except Exception as error:
+            RadolanPipeline.__put(chunkQueue, error, stopEvent)
+
+    def __untar(self, chunkQueue, memberQueue, stopEvent, readStopEvent, executor, decodeExecutor, xyxyTupleSet, arrayLambda, bz2Workers, forecastFilter):
+        try:
+            tarStream = io.BufferedReader(ChunkStream(RadolanPipeline.__iterQueue(chunkQueue, readStopEvent)), self.chunkSize)
+            fileStreams = RadolanBzipFile.getRequestedFileStreams(tarStream, forecastFilter, bz2Workers)
+            try:
+                for header, fileStream in fileStreams:
+                    if decodeExecutor != None:
+                        task = RadolanFile.submitBoxes(decodeExecutor, header, fileStream, xyxyTupleSet, arrayLambda)
+                    else:
+                        task = executor.submit(RadolanPipeline.__decode, header, fileStream.read(), xyxyTupleSet, arrayLambda)
+                    if not RadolanPipeline.__put(memberQueue, task, stopEvent):
+                        task.cancel()
+                        return
+            finally:
+                fileStreams.close()
+                readStopEvent.set() # the rest of the stream is not needed
+            RadolanPipeline.__put(memberQueue, None, stopEvent)
+        except Exception as error:
+            RadolanPipeline.__put(memberQueue, error, stopEvent)
+
+    @staticmethod
+    def __decode(header, payload, xyxyTupleSet, arrayLambda):
+        header_x = header['dimension']['x']
+        header_y = header['dimension']['y']
+        assert len(payload) >= header_x * header_y * 2, 'file too short'
+        rawGrid = numpy.frombuffer(payload, dtype='<u2', count=header_x * header_y).reshape(header_y, header_x)
+        boxes = []
+        RadolanFile.readRawGridBoxes(header, rawGrid, xyxyTupleSet, RadolanBoxes.collector(boxes, arrayLambda))
+        return header, boxes
+
+    @staticmethod
+    def __put(itemQueue, item, stopEvent):
+        # returns False if the pipeline was stopped before the item could be queued
+        while not stopEvent.is_set():
+            try:
+                itemQueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def __iterQueue(itemQueue, stopEvent=None):
+        # yields the items until None (or until the pipeline was stopped), raises the exceptions of the producer
+        while True:
+            try:
+                item = itemQueue.get(timeout=0.1)
+            except queue.Empty:
+                if stopEvent != None and stopEvent.is_set():
+                    return
+                continue
+            if item == None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
 
 class RadolanProducts:
 
@@ -95,28 +338,50 @@ class RadolanProducts:
         return 'https://opendata.dwd.de/weather/radar/composite'
 
     @staticmethod
-    def __getLatestRvDataFileUrl():
+    def getLatestRvDataFileUrl():
         return RadolanProducts.getCompositeBaseUrl()+'/rv/DE1200_RV_LATEST.tar.bz2'
 
     @staticmethod
     def getLatestRvDataTimestamp():
-        return RadolanProducts.getRadolanDataTimestamp(RadolanProducts.__getLatestRvDataFileUrl())
+        return RadolanProducts.getRadolanDataTimestamp(RadolanProducts.getLatestRvDataFileUrl())
 
     @staticmethod
     def getLatestRvData(xyxyTupleSet):
-        return RadolanProducts.getRvData(RadolanProducts.__getLatestRvDataFileUrl(), xyxyTupleSet)
+        return RadolanProducts.getRvData(RadolanProducts.getLatestRvDataFileUrl(), xyxyTupleSet)
 
     @staticmethod
-    def getRvData(bz2RvFileUrl, xyxyTupleSet):
+    def getRvData(bz2RvFileUrl, xyxyTupleSet, *, columnar=False, **options):
+        # columnar - return a RadolanForecastArray instead of the dict
+        # options - keyword options of iterRadolanForecastBoxes (e.g. forecastList, maxForecast, decodeExecutor)
+        if DwdHttp.cache != None and isinstance(bz2RvFileUrl, str) and options.get('cache') == None:
+            # the result is reused by the HttpCache while the file is not modified, it is kept
+            # as RadolanForecastArray which is copied (or converted to the dict) per call
+            key = ('getRvData', frozenset(xyxyTupleSet), RadolanForecastFilter(options.get('forecastList'), options.get('maxForecast')).getKey())
+            data = DwdHttp.getParsed(bz2RvFileUrl, lambda stream: RadolanProducts.getRvData(stream, xyxyTupleSet, columnar=True, **options), key)
+            return data.copy() if columnar else data.toDict()
         def valueLambda(value):
             if value > 0:
                 value = value * 12 # to get liter per hour as stated in the RV documentation
                 value = float("{:.2f}".format(value)) # shorten to 2 decimal numbers
             return value
-        return RadolanProducts.getRadolanForecastData(bz2RvFileUrl, xyxyTupleSet, valueLambda)
+        if columnar:
+            forecastBoxes = ((header['timestamp'], header['forecast'], boxes)
+                             for header, boxes in RadolanProducts.iterRadolanForecastBoxes(bz2RvFileUrl, xyxyTupleSet, RadolanBoxes.toRvRates, **options))
+            return RadolanForecastArray.fromBoxes(xyxyTupleSet, forecastBoxes)
+        return RadolanProducts.getRadolanForecastData(bz2RvFileUrl, xyxyTupleSet, valueLambda, **options)
+
+    @staticmethod
+    def decodeRvMember(memberBytes, xyxyTupleSet):
+        # returns (timestamp, forecast, [(xyxyTuple, values), ...]) of a RADOLAN file of the RV archive,
+        # the values are converted like by getRvData(columnar=True), e.g. for the decoding in an executor
+        stream = io.BytesIO(memberBytes)
+        header = RadolanFile.readHeader(stream)
+        boxes = []
+        RadolanFile.readBoxes(header, stream, xyxyTupleSet, RadolanBoxes.collector(boxes, RadolanBoxes.toRvRates))
+        return header['timestamp'], header['forecast'], boxes
 
     @staticmethod
-    def getRadolanForecastData(bz2FileUrl, xyxyTupleSet, valueLambda=None):
+    def getRadolanForecastData(bz2FileUrl, xyxyTupleSet, valueLambda=None, **options):
         timestamp = None
         curHeader = None
         forecasts = []
@@ -133,30 +398,85 @@ class RadolanProducts:
         def valuesCallback(xyTuple, value):
             nonlocal values
             values[xyTuple] = value
-        RadolanProducts.parseRadolanForecastData(bz2FileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda)
+        RadolanProducts.parseRadolanForecastData(bz2FileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda, **options)
         return { 'timestamp' : timestamp, 'forecasts' : forecasts }
 
     @staticmethod
-    def parseRadolanForecastData(bz2FileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda=None):
-        bzStream = urlopen(bz2FileUrl)
-        for fileName, fileStream in RadolanBzipFile.getFileStreams(bzStream):
-            # print(fileName)
-            header = RadolanFile.readHeader(fileStream)
-            # print(header)
-            nextFileCallback(header)
-            def intValuesCallback(xyTuple, value):
-                nonlocal valueLambda, valuesCallback
-                if valueLambda != None:
-                    value = valueLambda(value)
+    def parseRadolanForecastData(bz2FileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda=None, **options):
+        # per pixel variant of parseRadolanForecastData, nodata values are reported as -1
+        def boxesCallback(xyxyTuple, values):
+            for xyTuple, value in RadolanBoxes.iterPixels(xyxyTuple, values, valueLambda):
                 valuesCallback(xyTuple, value)
-            RadolanFile.readValues(header, fileStream, xyxyTupleSet, intValuesCallback)
-            fileStream.close()
-        bzStream.close()
+        RadolanProducts.parseRadolanForecastBoxes(bz2FileUrl, xyxyTupleSet, nextFileCallback, boxesCallback, **options)
+
+    @staticmethod
+    def parseRadolanForecastBoxes(bz2FileUrl, xyxyTupleSet, nextFileCallback, boxesCallback, arrayLambda=None, **options):
+        # calls the boxesCallback once per box and forecast with the box tuple and
+        # the (y1-y0+1, x1-x0+1) array of its values, nodata values are NaN
+        for header, boxes in RadolanProducts.iterRadolanForecastBoxes(bz2FileUrl, xyxyTupleSet, arrayLambda, **options):
+            nextFileCallback(header)
+            for xyxyTuple, values in boxes:
+                boxesCallback(xyxyTuple, values)
         nextFileCallback(None)
-        
+
+    @staticmethod
+    def iterRadolanForecastData(bz2FileUrl, xyxyTupleSet, valueLambda=None, **options):
+        # yields (forecast, {(x, y): value}) per forecast while the archive is still being read,
+        # nodata values are reported as -1
+        for header, boxes in RadolanProducts.iterRadolanForecastBoxes(bz2FileUrl, xyxyTupleSet, **options):
+            values = {}
+            for xyxyTuple, boxValues in boxes:
+                for xyTuple, value in RadolanBoxes.iterPixels(xyxyTuple, boxValues, valueLambda):
+                    values[xyTuple] = value
+            yield header['forecast'], values
+
+    @staticmethod
+    def iterRadolanForecastBoxes(bz2FileUrl, xyxyTupleSet, arrayLambda=None, *, forecastList=None, maxForecast=None,
+                                 bz2Workers=None, cache=None, pipeline=None, decodeExecutor=None):
+        # yields (header, [(xyxyTuple, values), ...]) per forecast while the archive is still being read,
+        # values is the (y1-y0+1, x1-x0+1) array of the box, nodata values are NaN
+        # forecastList / maxForecast restrict the forecasts (in minutes), the payload of the other
+        # forecasts is not decoded and the download stops after the last requested forecast
+        # bz2Workers - decompress the bzip2 blocks by this number of processes
+        # cache - RadolanCache, the members are read from the decompressed local copy
+        # pipeline - RadolanPipeline, download, decompression and decoding run concurrently
+        # decodeExecutor - decode the members in parallel by this thread or process pool, the results keep the forecast order
+        forecastFilter = RadolanForecastFilter(forecastList, maxForecast)
+        if cache != None:
+            for header, rawGrid in cache.getMembers(bz2FileUrl, bz2Workers):
+                if forecastFilter.isAfterLast(header['forecast']):
+                    break
+                if forecastFilter.isRequested(header['forecast']):
+                    boxes = []
+                    RadolanFile.readRawGridBoxes(header, rawGrid, xyxyTupleSet, RadolanBoxes.collector(boxes, arrayLambda))
+                    yield header, boxes
+            return
+        bzStream = DwdHttp.urlopen(bz2FileUrl)
+        if pipeline != None:
+            boxesIter = pipeline.iterBoxes(bzStream, xyxyTupleSet, arrayLambda, bz2Workers, forecastFilter, decodeExecutor)
+            try:
+                yield from boxesIter
+            finally:
+                boxesIter.close()
+                bzStream.close()
+            return
+        fileStreams = RadolanBzipFile.getRequestedFileStreams(bzStream, forecastFilter, bz2Workers)
+        try:
+            if decodeExecutor != None:
+                yield from SharedDecoding.iterResults(RadolanFile.submitBoxes(decodeExecutor, header, fileStream, xyxyTupleSet, arrayLambda)
+                                                      for header, fileStream in fileStreams)
+            else:
+                for header, fileStream in fileStreams:
+                    boxes = []
+                    RadolanFile.readBoxes(header, fileStream, xyxyTupleSet, RadolanBoxes.collector(boxes, arrayLambda))
+                    yield header, boxes
+        finally:
+            fileStreams.close()
+            bzStream.close()
+
     @staticmethod
     def getRadolanDataTimestamp(fileUrl):
-        return urlopen(Request(url=fileUrl, method='HEAD')).getheader('last-modified')
+        return DwdHttp.getLastModified(fileUrl)
 
 
 if __name__ == "__main__":
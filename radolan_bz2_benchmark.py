@@ -0,0 +1,22 @@
+from radolan import RadolanBzipFile
+from time import perf_counter
+import os
+#
+# compares the single threaded bz2 decompression with the parallel one
+#
+fileName = './testdata/DE1200_RV2506151820.tar.bz2'
+def readAll(workers):
+    start = perf_counter()
+    size = 0
+    with open(fileName, 'rb') as bzStream:
+        for name, fileStream in RadolanBzipFile.getFileStreams(bzStream, workers):
+            size += len(fileStream.read())
+    return size, perf_counter() - start
+
+if __name__ == "__main__":
+    size, duration = readAll(None)
+    print('sequential', size, 'bytes', round(duration, 3), 's')
+    for workers in sorted({2, 4, os.cpu_count()}):
+        parallelSize, parallelDuration = readAll(workers)
+        assert parallelSize == size, 'different size of decompressed data'
+        print('parallel', workers, 'workers', parallelSize, 'bytes', round(parallelDuration, 3), 's')
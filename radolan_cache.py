@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from dwd_http import DwdHttp
+import numpy
+from radolan import RadolanFile, RadolanBzipFile
+
+class RadolanCache:
+
+    index_file_name = 'index.json'
+
+    def __init__(self, cacheDir, maxBytes=1024 * 1024 * 1024, maxAge=300, maxOpenRuns=4):
+        # cacheDir - directory for the decompressed runs (one sub directory per run)
+        # maxBytes - size limit of the cache directory, the least recently used runs are removed first
+        # maxAge - seconds for which an url is not downloaded again (DWD publishes every 5 minutes)
+        # maxOpenRuns - number of runs kept memory mapped in this process
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.maxOpenRuns = maxOpenRuns
+        self.urlRuns = {}
+        self.openRuns = OrderedDict()
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def getMembers(self, bz2FileUrl, bz2Workers=None):
+        # returns [(header, rawGrid), ...] of the run provided by the url,
+        # rawGrid is a read only memory mapped (y, x) array of the raw values
+        urlRun = self.urlRuns.get(bz2FileUrl)
+        if urlRun == None or time.time() - urlRun[0] > self.maxAge:
+            urlRun = (time.time(), self.__storeRun(bz2FileUrl, bz2Workers))
+            self.urlRuns[bz2FileUrl] = urlRun
+            self.__evict(urlRun[1])
+        return self.__openRun(urlRun[1])
+
+    def __storeRun(self, bz2FileUrl, bz2Workers):
+        # decompresses the run into the cache unless it is already there, returns the run key
+        bzStream = DwdHttp.urlopen(bz2FileUrl)
+        tmpDir = None
+        try:
+            runKey = None
+            members = []
+            for fileName, fileStream in RadolanBzipFile.getFileStreams(bzStream, bz2Workers):
+                fileBytes = fileStream.read()
+                fileStream.close()
+                headerStream = io.BytesIO(fileBytes)
+                header = RadolanFile.readHeader(headerStream)
+                if runKey == None:
+                    runKey = header['product'] + '_' + header['timestamp'].replace(':', '-')
+                    if os.path.exists(os.path.join(self.cacheDir, runKey, RadolanCache.index_file_name)):
+                        return runKey # run already cached
+                    # unique per process and thread, the other workers may store the same run meanwhile
+                    tmpDir = tempfile.mkdtemp(prefix=runKey + '.tmp', dir=self.cacheDir)
+                memberFileName = str(len(members)) + '.bin'
+                with open(os.path.join(tmpDir, memberFileName), 'wb') as memberFile:
+                    memberFile.write(fileBytes)
+                members.append({'name' : fileName, 'file' : memberFileName, 'offset' : headerStream.tell(), 'header' : header})
+            assert runKey != None, 'no files in ' + bz2FileUrl
+            with open(os.path.join(tmpDir, RadolanCache.index_file_name), 'w') as indexFile:
+                json.dump(members, indexFile)
+            runDir = os.path.join(self.cacheDir, runKey)
+            if not os.path.exists(os.path.join(runDir, RadolanCache.index_file_name)): # not stored by another worker meanwhile
+                shutil.rmtree(runDir, ignore_errors=True)
+                os.rename(tmpDir, runDir)
+        finally:
+            bzStream.close()
+            if tmpDir != None:
+                shutil.rmtree(tmpDir, ignore_errors=True)
+        return runKey
+
+    def __openRun(self, runKey):
+        runDir = os.path.join(self.cacheDir, runKey)
+        os.utime(runDir) # mark as recently used
+        members = self.openRuns.get(runKey)
+        if members != None:
+            self.openRuns.move_to_end(runKey)
+            return members
+        with open(os.path.join(runDir, RadolanCache.index_file_name)) as indexFile:
+            index = json.load(indexFile)
+        members = []
+        for member in index:
+            header = member['header']
+            rawGrid = numpy.memmap(os.path.join(runDir, member['file']), dtype='<u2', mode='r', offset=member['offset'],
+                                   shape=(header['dimension']['y'], header['dimension']['x']))
+            members.append((header, rawGrid))
+        self.openRuns[runKey] = members
+        while len(self.openRuns) > self.maxOpenRuns:
+            self.openRuns.popitem(last=False)
+        return members
+
+    def __evict(self, keepRunKey):
+        # removes the least recently used runs until the cache fits into maxBytes
+        runs = []
+        totalBytes = 0
+        for runKey in os.listdir(self.cacheDir):
+            runDir = os.path.join(self.cacheDir, runKey)
+            if '.tmp' in runKey or not os.path.isdir(runDir):
+                continue
+            runBytes = sum(entry.stat().st_size for entry in os.scandir(runDir))
+            runs.append((os.stat(runDir).st_mtime, runKey, runBytes))
+            totalBytes += runBytes
+        for mtime, runKey, runBytes in sorted(runs):
+            if totalBytes <= self.maxBytes:
+                break
+            if runKey == keepRunKey:
+                continue
+            self.openRuns.pop(runKey, None)
+            shutil.rmtree(os.path.join(self.cacheDir, runKey), ignore_errors=True)
+            totalBytes -= runBytes
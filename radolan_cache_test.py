@@ -0,0 +1,13 @@
+from radolan import RadolanProducts
+from radolan_cache import RadolanCache
+import tempfile
+xyxy = (478, 335, 478, 335)
+with tempfile.TemporaryDirectory() as cacheDir:
+    cache = RadolanCache(cacheDir)
+    data = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy}, cache=cache)
+    print(data)
+    assert data == RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy})
+    assert data['forecasts'][0] == {'forecast': 0, 'values': {(478, 335): 5.28}}
+    assert data['forecasts'][24] == {'forecast': 120, 'values': {(478, 335): 1.32}}
+    # a new cache instance reuses the decompressed run
+    assert RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy}, cache=RadolanCache(cacheDir)) == data
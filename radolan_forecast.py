@@ -0,0 +1,60 @@
+import numpy
+
+class RadolanForecastFilter:
+
+    # restriction of the forecasts (in minutes) of a run by a list of forecasts and / or the maximum forecast,
+    # used by RadolanProducts and RadolanHdf5Products
+
+    def __init__(self, forecastList=None, maxForecast=None):
+        self.forecastList = forecastList
+        self.maxForecast = maxForecast
+        # last requested forecast or None if all forecasts are requested
+        if forecastList == None:
+            self.lastForecast = maxForecast
+        elif len(forecastList) == 0:
+            self.lastForecast = -1
+        else:
+            self.lastForecast = max(forecastList) if maxForecast == None else min(max(forecastList), maxForecast)
+
+    def isRequested(self, forecast):
+        return (self.forecastList == None or forecast in self.forecastList) and (self.maxForecast == None or forecast <= self.maxForecast)
+
+    def isAfterLast(self, forecast):
+        # True if the forecast and all following ones (of a run in forecast order) are not requested
+        return self.lastForecast != None and forecast > self.lastForecast
+
+    def isLast(self, forecast):
+        return forecast == self.lastForecast
+
+    def getKey(self):
+        # hashable key of the requested forecasts (e.g. for the parsed results of the HttpCache)
+        return (None if self.forecastList == None else frozenset(self.forecastList), self.maxForecast)
+
+class RadolanBoxes:
+
+    @staticmethod
+    def collector(boxes, arrayLambda=None):
+        # returns a boxes callback which appends (xyxyTuple, values) to boxes
+        def boxesCallback(xyxyTuple, values):
+            if arrayLambda != None:
+                values = arrayLambda(values)
+            boxes.append((xyxyTuple, values))
+        return boxesCallback
+
+    @staticmethod
+    def toRvRates(values):
+        # converts the RV values (mm per 5 minutes) of a box array to liter per hour as stated in the RV documentation,
+        # rounded to 2 decimals, NaN (nodata) is kept
+        return numpy.where(values > 0, numpy.round(values * 12, 2), values)
+
+    @staticmethod
+    def iterPixels(xyxyTuple, values, valueLambda=None):
+        # yields ((x, y), value) of a box array, NaN is converted to -1
+        x0, y0 = xyxyTuple[0], xyxyTuple[1]
+        for dy, row in enumerate(values.tolist()):
+            for dx, value in enumerate(row):
+                if value != value: # NaN
+                    value = -1
+                if valueLambda != None:
+                    value = valueLambda(value)
+                yield (x0 + dx, y0 + dy), value
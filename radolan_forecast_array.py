@@ -0,0 +1,95 @@
+import numpy
+
+class RadolanForecastArray:
+
+    # compact result of the RADOLAN forecast data:
+    # timestamp - timestamp of the run
+    # forecasts - (steps,) int32 array with the forecast minutes
+    # points - (points, 2) int32 array with the x, y coordinates
+    # values - (steps, points) float32 array, nodata values are NaN
+
+    def __init__(self, timestamp, forecasts, points, values, decimals=2):
+        self.timestamp = timestamp
+        self.forecasts = forecasts
+        self.points = points
+        self.values = values
+        self.decimals = decimals
+        self.__pointIndex = None
+
+    @staticmethod
+    def fromBoxes(xyxyTupleSet, forecastBoxes, decimals=2):
+        # forecastBoxes - iterable of (timestamp, forecast, [(xyxyTuple, values), ...])
+        # as provided by the iterRadolanForecastBoxes functions
+        boxList = list(xyxyTupleSet)
+        pointsList = []
+        for x0, y0, x1, y1 in boxList:
+            ys, xs = numpy.mgrid[y0 : y1 + 1, x0 : x1 + 1]
+            pointsList.append(numpy.stack([xs.ravel(), ys.ravel()], axis=1))
+        if len(pointsList) == 0:
+            pointsList.append(numpy.empty((0, 2), dtype=numpy.int32))
+        allPoints = numpy.concatenate(pointsList)
+        # overlapping boxes: keep the first occurrence of every point
+        select = numpy.sort(numpy.unique(allPoints, axis=0, return_index=True)[1])
+        timestamp = None
+        forecasts = []
+        rows = []
+        for curTimestamp, forecast, boxes in forecastBoxes:
+            timestamp = curTimestamp
+            boxValues = dict(boxes)
+            row = [boxValues[xyxyTuple].ravel() for xyxyTuple in boxList]
+            forecasts.append(forecast)
+            rows.append(numpy.concatenate(row)[select].astype(numpy.float32) if len(row) > 0 else numpy.empty(0, dtype=numpy.float32))
+        values = numpy.stack(rows) if len(rows) > 0 else numpy.empty((0, len(select)), dtype=numpy.float32)
+        return RadolanForecastArray(timestamp, numpy.array(forecasts, dtype=numpy.int32),
+                                    allPoints[select].astype(numpy.int32), values, decimals)
+
+    def getValue(self, xyTuple, forecast):
+        # returns the value of the point and forecast, nodata is returned as -1
+        return self.__toValue(self.values[self.__getForecastIndex(forecast), self.__getPointIndex(xyTuple)])
+
+    def getValues(self, forecast):
+        # returns {(x, y): value} of the forecast, nodata is returned as -1
+        return dict(zip(map(tuple, self.points.tolist()), map(self.__toValue, self.values[self.__getForecastIndex(forecast)].tolist())))
+
+    def getPointValues(self, xyTuple):
+        # returns {forecast: value} of the point, nodata is returned as -1
+        return dict(zip(self.forecasts.tolist(), map(self.__toValue, self.values[:, self.__getPointIndex(xyTuple)].tolist())))
+
+    def copy(self):
+        # returns an independent copy (the arrays are copied as a whole)
+        return RadolanForecastArray(self.timestamp, self.forecasts.copy(), self.points.copy(), self.values.copy(), self.decimals)
+
+    def toDict(self):
+        # returns the data in the format of the getRvData functions
+        return {
+            'timestamp' : self.timestamp,
+            'forecasts' : [{'forecast' : forecast, 'values' : self.getValues(forecast)} for forecast in self.forecasts.tolist()]
+        }
+
+    def save(self, file):
+        numpy.savez(file, timestamp=numpy.array('' if self.timestamp == None else self.timestamp),
+                    forecasts=self.forecasts, points=self.points, values=self.values, decimals=numpy.array(self.decimals))
+
+    @staticmethod
+    def load(file):
+        with numpy.load(file) as data:
+            timestamp = str(data['timestamp'])
+            return RadolanForecastArray(None if timestamp == '' else timestamp, data['forecasts'], data['points'],
+                                        data['values'], int(data['decimals']))
+
+    def __toValue(self, value):
+        value = float(value)
+        if value != value: # NaN
+            return -1
+        return round(value, self.decimals)
+
+    def __getForecastIndex(self, forecast):
+        indexes = numpy.flatnonzero(self.forecasts == forecast)
+        assert len(indexes) > 0, "forecast " + str(forecast) + " is not available"
+        return indexes[0]
+
+    def __getPointIndex(self, xyTuple):
+        if self.__pointIndex == None:
+            self.__pointIndex = {xy : index for index, xy in enumerate(map(tuple, self.points.tolist()))}
+        assert xyTuple in self.__pointIndex, "point " + str(xyTuple) + " is not available"
+        return self.__pointIndex[xyTuple]
@@ -0,0 +1,17 @@
+from radolan import RadolanProducts
+from radolan_forecast_array import RadolanForecastArray
+import io
+xyxyTupleSet = {(478, 335, 478, 335), (470, 330, 480, 340)}
+data = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', xyxyTupleSet, columnar=True)
+print(data.values.shape)
+assert data.values.shape == (25, 121)
+assert data.getValue((478, 335), 0) == 5.28
+assert data.getPointValues((478, 335))[120] == 1.32
+assert data.toDict() == RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', xyxyTupleSet)
+file = io.BytesIO()
+data.save(file)
+file.seek(0)
+assert RadolanForecastArray.load(file).toDict() == data.toDict()
+copied = data.copy()
+copied.values[:] = 0
+assert data.getValue((478, 335), 0) == 5.28 and copied.getValue((478, 335), 0) == 0
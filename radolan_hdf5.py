@@ -2,13 +2,30 @@
 from math import sin, cos, radians, ceil
 import tarfile
 import h5py
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError
+import numpy
+from radolan_forecast_array import RadolanForecastArray
+from radolan_forecast import RadolanForecastFilter, RadolanBoxes
+from urllib.request import url2pathname
+from dwd_http import DwdHttp
+from urllib.parse import urlparse
 from datetime import datetime
 import io
+import os
+import json
+from collections import OrderedDict
+from shared_payload import SharedPayload, SharedDecoding
 
 class RadolanHdf5File:
 
+    signature = b'\x89HDF\r\n\x1a\n'
+
+    @staticmethod
+    def isHdf5(fileobj):
+        # checks the signature at the start of the (seekable) file object, e.g. to skip other tar members
+        isHdf5 = fileobj.read(len(RadolanHdf5File.signature)) == RadolanHdf5File.signature
+        fileobj.seek(0)
+        return isHdf5
+
     @staticmethod
     def __convertToTime(YYMMDD, HHMMSS):
         # '2022-06-13T12:00:00.000Z
@@ -32,27 +49,384 @@ class RadolanHdf5File:
             }
         
     @staticmethod
-    def readValues(info, dataSet, xyxyTupleSet, callback):
+    def __checkBoxes(info, xyxyTupleSet):
         for x0, y0, x1, y1 in xyxyTupleSet:
-            assert x0 < info['xsize'], "x0 (" + str(x1) + ") shall be lesser than " + str(info['xsize'])
-            assert y0 < info['ysize'], "y0 (" + str(y1)  + ") shall be lesser than " + str(info['ysize'])
+            assert x0 < info['xsize'], "x0 (" + str(x0) + ") shall be lesser than " + str(info['xsize'])
+            assert y0 < info['ysize'], "y0 (" + str(y0)  + ") shall be lesser than " + str(info['ysize'])
             assert x1 < info['xsize'], "x1 (" + str(x1) + ") shall be lesser than " + str(info['xsize'])
             assert y1 < info['ysize'], "y1 (" + str(y1)  + ") shall be lesser than " + str(info['ysize'])
-        data = dataSet[()]
+
+    @staticmethod
+    def readValues(info, dataSet, xyxyTupleSet, callback):
+        RadolanHdf5File.__checkBoxes(info, xyxyTupleSet)
         for xyxyTuple in xyxyTupleSet:
-            for y in range(xyxyTuple[1], xyxyTuple[3]+1):
-                for x in range(xyxyTuple[0], xyxyTuple[2]+1):
-                    value = data[y, x]
-                    value = value.item()
-                    # print(value)
-                    if value == info['nodata']:
+            x0, y0, x1, y1 = xyxyTuple
+            # reads only the chunks of the box
+            values = RadolanHdf5File.calibrate(info, dataSet[y0 : y1 + 1, x0 : x1 + 1])
+            for dy, row in enumerate(values.tolist()):
+                for dx, value in enumerate(row):
+                    if value != value: # NaN
                         value = -1
-                    else:
-                        value = round(value * info['gain'] + info['offset'], 2)
-                    # print(value)
-                    callback((x, y), value)
-                    x = x + 1
-                    y = y + 1 
+                    callback((x0 + dx, y0 + dy), value)
+
+    @staticmethod
+    def readBoxes(info, dataSet, xyxyTupleSet, callback):
+        # calls the callback once per box with the calibrated (y1-y0+1, x1-x0+1) array, nodata values are NaN
+        RadolanHdf5File.__checkBoxes(info, xyxyTupleSet)
+        for xyxyTuple in xyxyTupleSet:
+            x0, y0, x1, y1 = xyxyTuple
+            # reads only the chunks of the box
+            callback(xyxyTuple, RadolanHdf5File.calibrate(info, dataSet[y0 : y1 + 1, x0 : x1 + 1]))
+
+    @staticmethod
+    def readGrid(info, dataSet, raw=False):
+        # returns the whole (y, x) grid as calibrated float32 array with NaN for nodata
+        # or with raw=True the stored integer values to be calibrated later with calibrate
+        data = dataSet[()]
+        if raw:
+            return data
+        return RadolanHdf5File.calibrate(info, data, numpy.float32)
+
+    @staticmethod
+    def calibrate(info, rawData, dtype=numpy.float64):
+        values = rawData.astype(dtype)
+        values *= dtype(info['gain'])
+        values += dtype(info['offset'])
+        numpy.round(values, 2, out=values)
+        values[rawData == info['nodata']] = numpy.nan
+        return values
+
+    @staticmethod
+    def decodeSharedBoxes(payloadPath, boxesPath, xyxyList):
+        # runs in the executor, see SharedDecoding, returns the info of the member
+        with h5py.File(payloadPath, 'r') as h5:
+            info = RadolanHdf5File.readInfo(h5)
+            boxValues = []
+            RadolanHdf5File.readBoxes(info, h5['dataset1']['data1']['data'], xyxyList, lambda xyxyTuple, values: boxValues.append(values))
+        SharedPayload.writeBoxes(boxesPath, boxValues)
+        return info
+
+class TarMemberFile(io.RawIOBase):
+
+    # read only file object of a tar member within the (uncompressed) tar file,
+    # the member data is read directly from the tar file without a copy
+
+    def __init__(self, fileobj, offset, size):
+        self.fileobj = fileobj
+        self.offset = offset
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = max(0, min(len(buffer), self.size - self.pos))
+        if length == 0:
+            return 0
+        # the file object may be shared (e.g. with the tarfile), so always seek
+        self.fileobj.seek(self.offset + self.pos)
+        length = self.fileobj.readinto(memoryview(buffer)[:length])
+        self.pos += length
+        return length
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        assert pos >= 0, 'negative seek position'
+        self.pos = pos
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+class RemoteRangeFile(io.RawIOBase):
+
+    # read only file object of a remote file part (e.g. a tar member) which fetches
+    # the requested blocks with HTTP range requests and keeps the recently used ones
+
+    def __init__(self, url, offset, size, blockSize=64 * 1024, maxBlocks=32):
+        self.url = url
+        self.offset = offset
+        self.size = size
+        self.blockSize = blockSize
+        self.maxBlocks = maxBlocks
+        self.blocks = OrderedDict()
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = max(0, min(len(buffer), self.size - self.pos))
+        if length == 0:
+            return 0
+        firstBlock = self.pos // self.blockSize
+        lastBlock = (self.pos + length - 1) // self.blockSize
+        self.__fetchBlocks(firstBlock, lastBlock)
+        view = memoryview(buffer)
+        written = 0
+        for blockIndex in range(firstBlock, lastBlock + 1):
+            block = self.blocks[blockIndex]
+            self.blocks.move_to_end(blockIndex)
+            start = self.pos + written - blockIndex * self.blockSize
+            part = min(len(block) - start, length - written)
+            view[written : written + part] = block[start : start + part]
+            written += part
+        self.pos += written
+        self.__evictBlocks()
+        return written
+
+    def __fetchBlocks(self, firstBlock, lastBlock):
+        # fetches the missing blocks, consecutive missing blocks with one request
+        blockIndex = firstBlock
+        while blockIndex <= lastBlock:
+            if blockIndex in self.blocks:
+                blockIndex += 1
+                continue
+            endIndex = blockIndex
+            while endIndex + 1 <= lastBlock and endIndex + 1 not in self.blocks:
+                endIndex += 1
+            start = blockIndex * self.blockSize
+            end = min((endIndex + 1) * self.blockSize, self.size)
+            data = RadolanHdf5RemoteTar.readRange(self.url, self.offset + start, end - start)
+            assert len(data) == end - start, 'file too short'
+            for index in range(blockIndex, endIndex + 1):
+                self.blocks[index] = data[(index - blockIndex) * self.blockSize : (index - blockIndex + 1) * self.blockSize]
+            blockIndex = endIndex + 1
+
+    def __evictBlocks(self):
+        while len(self.blocks) > self.maxBlocks:
+            self.blocks.popitem(last=False)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        assert pos >= 0, 'negative seek position'
+        self.pos = pos
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+class RadolanHdf5TarFile:
+
+    @staticmethod
+    def getLocalPath(h5TarFileUrl):
+        # returns the path for file: urls and existing local paths, None otherwise (e.g. for opened streams)
+        if not isinstance(h5TarFileUrl, str):
+            return None
+        url = urlparse(h5TarFileUrl)
+        if url.scheme == 'file':
+            return url2pathname(url.path)
+        if url.scheme == '' and os.path.exists(h5TarFileUrl):
+            return h5TarFileUrl
+        return None
+
+    @staticmethod
+    def getH5Files(h5TarFileUrl):
+        # yields [name, h5py.File] of the tar members, the h5py.File is closed when the next member is requested
+        # local tar files are read in place, remote ones are streamed and each member is copied into memory
+        localPath = RadolanHdf5TarFile.getLocalPath(h5TarFileUrl)
+        if localPath != None:
+            with open(localPath, 'rb') as tarFile:
+                tf = tarfile.open(fileobj=tarFile, mode='r:')
+                for fileInfo in tf:
+                    memberFile = TarMemberFile(tarFile, fileInfo.offset_data, fileInfo.size)
+                    if fileInfo.isfile() and RadolanHdf5File.isHdf5(memberFile):
+                        h5 = h5py.File(memberFile, 'r')
+                        try:
+                            yield [fileInfo.name, h5]
+                        finally:
+                            h5.close()
+            return
+        tarStream = DwdHttp.urlopen(h5TarFileUrl)
+        try:
+            tf = tarfile.open(fileobj=tarStream, mode='r|')
+            for fileInfo in tf:
+                # print(fileInfo)
+                if fileInfo.isfile():
+                    h5mem = io.BytesIO(tf.extractfile(fileInfo).read())
+                    if not RadolanHdf5File.isHdf5(h5mem):
+                        continue
+                    h5 = h5py.File(h5mem, 'r')
+                    try:
+                        yield [fileInfo.name, h5]
+                    finally:
+                        h5.close()
+        finally:
+            tarStream.close()
+
+class RadolanHdf5TarIndex:
+
+    # index of the members of an uncompressed HDF5 tar file:
+    # [{'name', 'forecast', 'offset', 'size'}, ...] with the offset and size of the member data
+
+    @staticmethod
+    def getIndex(tarPath, indexPath=None):
+        # returns the stored index (default tarPath + '.index.json') or builds and stores it
+        # if it is missing or was built for another version of the tar file
+        if indexPath == None:
+            indexPath = tarPath + '.index.json'
+        tarStat = os.stat(tarPath)
+        try:
+            with open(indexPath) as indexFile:
+                index = json.load(indexFile)
+            if index['size'] == tarStat.st_size and index['mtime'] == tarStat.st_mtime:
+                return index['members']
+        except (OSError, ValueError, KeyError):
+            pass
+        members = RadolanHdf5TarIndex.build(tarPath)
+        try:
+            with open(indexPath, 'w') as indexFile:
+                json.dump({'size' : tarStat.st_size, 'mtime' : tarStat.st_mtime, 'members' : members}, indexFile)
+        except OSError:
+            pass # not writable, the index is built again next time
+        return members
+
+    @staticmethod
+    def build(tarPath):
+        members = []
+        with open(tarPath, 'rb') as tarFile:
+            tf = tarfile.open(fileobj=tarFile, mode='r:')
+            for fileInfo in tf:
+                memberFile = TarMemberFile(tarFile, fileInfo.offset_data, fileInfo.size)
+                if fileInfo.isfile() and RadolanHdf5File.isHdf5(memberFile):
+                    with h5py.File(memberFile, 'r') as h5:
+                        info = RadolanHdf5File.readInfo(h5)
+                    members.append({'name' : fileInfo.name, 'forecast' : info['forecast'],
+                                    'offset' : fileInfo.offset_data, 'size' : fileInfo.size})
+        return members
+
+    @staticmethod
+    def findMember(members, forecast):
+        for member in members:
+            if member['forecast'] == forecast:
+                return member
+        return None
+
+    @staticmethod
+    def openMember(tarFile, member):
+        # tarFile is the opened (binary) tar file
+        return h5py.File(TarMemberFile(tarFile, member['offset'], member['size']), 'r')
+
+class RadolanHdf5RemoteTar:
+
+    # random access to the members of a remote uncompressed tar file with HTTP range requests
+    # the RV members are stored in forecast order
+    block_size = tarfile.BLOCKSIZE
+    # blocks of the members fetched by h5py, the info of a member is usually within the first one
+    member_block_size = 16 * 1024
+
+    @staticmethod
+    def openRange(url, offset, length):
+        # returns the response, its status is 200 (whole file) if the server ignores the range
+        return DwdHttp.request(url, {'Range' : 'bytes=' + str(offset) + '-' + str(offset + length - 1)})
+
+    @staticmethod
+    def readRange(url, offset, length):
+        response = RadolanHdf5RemoteTar.openRange(url, offset, length)
+        try:
+            assert response.status == 206, 'server does not support range requests for ' + url
+            return response.read()
+        finally:
+            response.close()
+
+    @staticmethod
+    def iterMembers(url, firstHeader=None):
+        # yields {'name', 'offset', 'size'} of the file members, only the 512 byte headers are fetched
+        # firstHeader - the already fetched header at offset 0
+        offset = 0
+        longName = None
+        while True:
+            if offset == 0 and firstHeader != None:
+                headerBytes = firstHeader
+            else:
+                headerBytes = RadolanHdf5RemoteTar.readRange(url, offset, RadolanHdf5RemoteTar.block_size)
+            if len(headerBytes) < RadolanHdf5RemoteTar.block_size:
+                return
+            try:
+                tarInfo = tarfile.TarInfo.frombuf(headerBytes, tarfile.ENCODING, 'surrogateescape')
+            except tarfile.EOFHeaderError:
+                return # end of archive
+            dataOffset = offset + RadolanHdf5RemoteTar.block_size
+            if tarInfo.type in (tarfile.GNUTYPE_LONGNAME, tarfile.XHDTYPE):
+                # the name of the next member is stored in the data of this one
+                data = RadolanHdf5RemoteTar.readRange(url, dataOffset, tarInfo.size)
+                longName = RadolanHdf5RemoteTar.__readLongName(tarInfo.type, data)
+            elif tarInfo.isfile():
+                yield {'name' : tarInfo.name if longName == None else longName, 'offset' : dataOffset, 'size' : tarInfo.size}
+                longName = None
+            offset = dataOffset + -(-tarInfo.size // RadolanHdf5RemoteTar.block_size) * RadolanHdf5RemoteTar.block_size
+
+    @staticmethod
+    def __readLongName(type, data):
+        if type == tarfile.GNUTYPE_LONGNAME:
+            return data.rstrip(b'\x00').decode(tarfile.ENCODING, 'surrogateescape')
+        # pax header records: "<length> <key>=<value>\n"
+        for record in data.split(b'\n'):
+            key, sep, value = record.partition(b'=')
+            if sep and key.split(b' ', 1)[-1] == b'path':
+                return value.decode('utf-8', 'surrogateescape')
+        return None
+
+    @staticmethod
+    def iterH5Files(url, forecastFilter, lazy=False):
+        # yields [name, h5py.File] of the forecasts requested by the RadolanForecastFilter,
+        # the forecast is taken from the info of the member (only its first blocks are fetched),
+        # only the requested members are downloaded (lazy: only the parts read by h5py)
+        # if the server ignores range requests the whole tar file is streamed instead
+        missing = None
+        if forecastFilter.forecastList != None:
+            missing = {forecast for forecast in forecastFilter.forecastList if forecastFilter.isRequested(forecast)}
+        response = RadolanHdf5RemoteTar.openRange(url, 0, RadolanHdf5RemoteTar.block_size)
+        if response.status == 206:
+            try:
+                firstHeader = response.read()
+            finally:
+                response.close()
+            h5Files = RadolanHdf5RemoteTar.__iterRangeH5Files(url, firstHeader, forecastFilter, lazy)
+        else:
+            h5Files = RadolanHdf5TarFile.getH5Files(response)
+        try:
+            for fileName, h5 in h5Files:
+                forecast = RadolanHdf5File.readInfo(h5)['forecast']
+                if missing == None and forecastFilter.isAfterLast(forecast):
+                    return
+                if forecastFilter.isRequested(forecast) and (missing == None or forecast in missing):
+                    yield [fileName, h5]
+                    if missing != None:
+                        missing.discard(forecast)
+                        if len(missing) == 0:
+                            return # all requested forecasts found
+        finally:
+            h5Files.close()
+
+    @staticmethod
+    def __iterRangeH5Files(url, firstHeader, forecastFilter, lazy):
+        # yields [name, h5py.File] of all HDF5 members, the requested ones are downloaded completely unless lazy
+        for member in RadolanHdf5RemoteTar.iterMembers(url, firstHeader):
+            memberFile = RemoteRangeFile(url, member['offset'], member['size'], RadolanHdf5RemoteTar.member_block_size)
+            if not RadolanHdf5File.isHdf5(memberFile):
+                continue
+            h5 = h5py.File(memberFile, 'r')
+            try:
+                if not lazy and forecastFilter.isRequested(RadolanHdf5File.readInfo(h5)['forecast']):
+                    h5.close()
+                    h5 = h5py.File(io.BytesIO(RadolanHdf5RemoteTar.readRange(url, member['offset'], member['size'])), 'r')
+                yield [member['name'], h5]
+            finally:
+                h5.close()
 
 class RadolanHdf5Products:
 
@@ -61,28 +435,56 @@ class RadolanHdf5Products:
         return 'https://opendata.dwd.de/weather/radar/composite'
 
     @staticmethod
-    def __getLatestRvDataFileUrl():
+    def getLatestRvDataFileUrl():
         return RadolanHdf5Products.getCompositeBaseUrl()+'/rv/composite_rv_LATEST.tar'
 
     @staticmethod
     def getLatestRvDataTimestamp():
-        return RadolanHdf5Products.getRadolanDataTimestamp(RadolanHdf5Products.__getLatestRvDataFileUrl())
+        return RadolanHdf5Products.getRadolanDataTimestamp(RadolanHdf5Products.getLatestRvDataFileUrl())
 
     @staticmethod
     def getLatestRvData(xyTupleSet):
-        return RadolanHdf5Products.getRvData(RadolanHdf5Products.__getLatestRvDataFileUrl(), xyTupleSet)
+        return RadolanHdf5Products.getRvData(RadolanHdf5Products.getLatestRvDataFileUrl(), xyTupleSet)
 
     @staticmethod
-    def getRvData(h5TarFileUrl, xyTupleSet):
+    def getRvData(h5TarFileUrl, xyTupleSet, *, columnar=False, **options):
+        # columnar - return a RadolanForecastArray instead of the dict
+        # options - keyword options of iterRadolanForecastBoxes (e.g. forecastList, maxForecast, decodeExecutor)
+        forecastFilter = RadolanForecastFilter(options.get('forecastList'), options.get('maxForecast'))
+        if DwdHttp.cache != None and isinstance(h5TarFileUrl, str) and forecastFilter.lastForecast == None and not options.get('lazy', False) \
+            and RadolanHdf5TarFile.getLocalPath(h5TarFileUrl) == None:
+            # the whole file is downloaded (no range requests), the result is reused by the HttpCache while it is not modified,
+            # it is kept as RadolanForecastArray which is copied (or converted to the dict) per call
+            key = ('getRvData', frozenset(xyTupleSet), forecastFilter.getKey())
+            data = DwdHttp.getParsed(h5TarFileUrl, lambda stream: RadolanHdf5Products.getRvData(stream, xyTupleSet, columnar=True, **options), key)
+            return data.copy() if columnar else data.toDict()
         def valueLambda(value):
             if value > 0:
                 value = value * 12 # to get liter per hour as stated in the RV documentation
                 value = float("{:.2f}".format(value)) # shorten to 2 decimal numbers
             return value
-        return RadolanHdf5Products.getRadolanForecastData(h5TarFileUrl, xyTupleSet, valueLambda)
+        if columnar:
+            forecastBoxes = ((RadolanHdf5Products.__convertToString(info['timestamp']), info['forecast'], boxes)
+                             for info, boxes in RadolanHdf5Products.iterRadolanForecastBoxes(h5TarFileUrl, xyTupleSet, RadolanBoxes.toRvRates, **options))
+            return RadolanForecastArray.fromBoxes(xyTupleSet, forecastBoxes)
+        return RadolanHdf5Products.getRadolanForecastData(h5TarFileUrl, xyTupleSet, valueLambda, **options)
     
     @staticmethod
-    def getRadolanForecastData(h5TarFileUrl, xyxyTupleSet, valueLambda=None):
+    def decodeRvMember(memberBytes, xyTupleSet, forecastFilter=None):
+        # returns (timestamp, forecast, [(xyxyTuple, values), ...]) of a HDF5 file of the RV tar file or None for other files,
+        # the values are converted like by getRvData(columnar=True), the boxes are None for forecasts not requested by the filter
+        h5File = io.BytesIO(memberBytes)
+        if not RadolanHdf5File.isHdf5(h5File):
+            return None
+        with h5py.File(h5File, 'r') as h5:
+            info = RadolanHdf5File.readInfo(h5)
+            boxes = None
+            if forecastFilter == None or forecastFilter.isRequested(info['forecast']):
+                boxes = RadolanHdf5Products.__readBoxes(h5, xyTupleSet, RadolanBoxes.toRvRates, info)[1]
+        return RadolanHdf5Products.__convertToString(info['timestamp']), info['forecast'], boxes
+
+    @staticmethod
+    def getRadolanForecastData(h5TarFileUrl, xyxyTupleSet, valueLambda=None, **options):
         timestamp = None
         curInfo = None
         forecasts = []
@@ -99,37 +501,145 @@ class RadolanHdf5Products:
         def valuesCallback(xyTuple, value):
             nonlocal values
             values[xyTuple] = value
-        RadolanHdf5Products.parseRadolanForecastData(h5TarFileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda)
+        RadolanHdf5Products.parseRadolanForecastData(h5TarFileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda, **options)
         return { 'timestamp' : RadolanHdf5Products.__convertToString(timestamp), 'forecasts' : forecasts }
     
     @staticmethod
-    def parseRadolanForecastData(h5TarFileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda=None):
-        tarStream = urlopen(h5TarFileUrl)
-        timestamp = ''
-        forecasts = []
-        tf = tarfile.open(fileobj=tarStream, mode='r|')
-        for fileInfo in tf:
-            # print(fileInfo)
-            h5mem = io.BytesIO(tf.extractfile(fileInfo).read())
-            h5 = h5py.File(h5mem, 'r')
-            info = RadolanHdf5File.readInfo(h5)
-            nextFileCallback(info)
-            def intValuesCallback(xyTuple, value):
-                nonlocal valueLambda, valuesCallback
-                if valueLambda != None:
-                    value = valueLambda(value)
+    def parseRadolanForecastData(h5TarFileUrl, xyxyTupleSet, nextFileCallback, valuesCallback, valueLambda=None, **options):
+        # per pixel variant of parseRadolanForecastData, nodata values are reported as -1
+        def boxesCallback(xyxyTuple, values):
+            for xyTuple, value in RadolanBoxes.iterPixels(xyxyTuple, values, valueLambda):
                 valuesCallback(xyTuple, value)
-            RadolanHdf5File.readValues(info, h5['dataset1']['data1']['data'], xyxyTupleSet, intValuesCallback)
-            h5.close()
-        tarStream.close()
+        RadolanHdf5Products.parseRadolanForecastBoxes(h5TarFileUrl, xyxyTupleSet, nextFileCallback, boxesCallback, **options)
+
+    @staticmethod
+    def parseRadolanForecastBoxes(h5TarFileUrl, xyxyTupleSet, nextFileCallback, boxesCallback, arrayLambda=None, **options):
+        # calls the boxesCallback once per box and forecast with the box tuple and
+        # the (y1-y0+1, x1-x0+1) array of its values, nodata values are NaN
+        for info, boxes in RadolanHdf5Products.iterRadolanForecastBoxes(h5TarFileUrl, xyxyTupleSet, arrayLambda, **options):
+            nextFileCallback(info)
+            for xyxyTuple, values in boxes:
+                boxesCallback(xyxyTuple, values)
         nextFileCallback(None)
 
+    @staticmethod
+    def iterRadolanForecastData(h5TarFileUrl, xyxyTupleSet, valueLambda=None, **options):
+        # yields (forecast, {(x, y): value}) per forecast while the tar file is still being read,
+        # nodata values are reported as -1
+        for info, boxes in RadolanHdf5Products.iterRadolanForecastBoxes(h5TarFileUrl, xyxyTupleSet, **options):
+            values = {}
+            for xyxyTuple, boxValues in boxes:
+                for xyTuple, value in RadolanBoxes.iterPixels(xyxyTuple, boxValues, valueLambda):
+                    values[xyTuple] = value
+            yield info['forecast'], values
+
+    @staticmethod
+    def iterRadolanForecastBoxes(h5TarFileUrl, xyxyTupleSet, arrayLambda=None, *, forecastList=None, maxForecast=None, lazy=False, decodeExecutor=None):
+        # yields (info, [(xyxyTuple, values), ...]) per forecast while the tar file is still being read,
+        # values is the (y1-y0+1, x1-x0+1) array of the box, nodata values are NaN
+        # forecastList / maxForecast restrict the forecasts (in minutes), the data of the other
+        # forecasts is not decoded and the download stops after the last requested forecast
+        # for http(s) urls only the requested members are downloaded with range requests
+        # lazy - read only the needed parts (HDF5 structures and chunks) of the remote members with range requests,
+        # e.g. for single points, the parts are not cached by the HttpCache
+        # decodeExecutor - decode the members in parallel by this thread or process pool, the results keep the forecast order
+        forecastFilter = RadolanForecastFilter(forecastList, maxForecast)
+        localPath = RadolanHdf5TarFile.getLocalPath(h5TarFileUrl)
+        remote = (forecastFilter.lastForecast != None or lazy) and isinstance(h5TarFileUrl, str) and urlparse(h5TarFileUrl).scheme in ('http', 'https')
+        if decodeExecutor != None and not remote:
+            yield from SharedDecoding.iterResults(RadolanHdf5Products.__submitMembers(h5TarFileUrl, localPath, xyxyTupleSet, arrayLambda, forecastFilter, decodeExecutor))
+            return
+        if localPath != None and forecastFilter.lastForecast != None:
+            # seek directly to the requested members
+            with open(localPath, 'rb') as tarFile:
+                for member in RadolanHdf5TarIndex.getIndex(localPath):
+                    if forecastFilter.isRequested(member['forecast']):
+                        with RadolanHdf5TarIndex.openMember(tarFile, member) as h5:
+                            yield RadolanHdf5Products.__readBoxes(h5, xyxyTupleSet, arrayLambda)
+            return
+        if remote:
+            # download only the requested members (or only the needed parts of them)
+            h5Files = RadolanHdf5RemoteTar.iterH5Files(h5TarFileUrl, forecastFilter, lazy)
+            try:
+                for fileName, h5 in h5Files:
+                    yield RadolanHdf5Products.__readBoxes(h5, xyxyTupleSet, arrayLambda)
+            finally:
+                h5Files.close()
+            return
+        h5Files = RadolanHdf5TarFile.getH5Files(h5TarFileUrl)
+        try:
+            for fileName, h5 in h5Files:
+                # print(fileName)
+                info = RadolanHdf5File.readInfo(h5)
+                if forecastFilter.isAfterLast(info['forecast']):
+                    break
+                if forecastFilter.isRequested(info['forecast']):
+                    yield RadolanHdf5Products.__readBoxes(h5, xyxyTupleSet, arrayLambda, info)
+                if forecastFilter.isLast(info['forecast']):
+                    break
+        finally:
+            h5Files.close()
+
+    @staticmethod
+    def __readBoxes(h5, xyxyTupleSet, arrayLambda, info=None):
+        # returns (info, [(xyxyTuple, values), ...]) of the member
+        if info == None:
+            info = RadolanHdf5File.readInfo(h5)
+        boxes = []
+        RadolanHdf5File.readBoxes(info, h5['dataset1']['data1']['data'], xyxyTupleSet, RadolanBoxes.collector(boxes, arrayLambda))
+        return info, boxes
+
+    @staticmethod
+    def __submitMembers(h5TarFileUrl, localPath, xyxyTupleSet, arrayLambda, forecastFilter, decodeExecutor):
+        # yields the SharedDecoding of the requested members, the members are copied into shared memory
+        # (the not requested ones of a streamed tar file are released after reading their info)
+        if localPath != None:
+            with open(localPath, 'rb') as tarFile:
+                for member in RadolanHdf5TarIndex.getIndex(localPath):
+                    if forecastFilter.isRequested(member['forecast']):
+                        payload = SharedPayload.copyFrom(TarMemberFile(tarFile, member['offset'], member['size']), member['size'])
+                        yield SharedDecoding(decodeExecutor, RadolanHdf5File.decodeSharedBoxes, payload, xyxyTupleSet, arrayLambda)
+            return
+        tarStream = DwdHttp.urlopen(h5TarFileUrl)
+        try:
+            tf = tarfile.open(fileobj=tarStream, mode='r|')
+            for fileInfo in tf:
+                if not fileInfo.isfile():
+                    continue
+                payload = SharedPayload.copyFrom(tf.extractfile(fileInfo), fileInfo.size)
+                try:
+                    forecast = RadolanHdf5Products.__readForecast(payload.path)
+                except:
+                    payload.release()
+                    raise
+                if forecast == None or not forecastFilter.isRequested(forecast):
+                    payload.release()
+                    if forecast != None and forecastFilter.isAfterLast(forecast):
+                        break
+                    continue
+                yield SharedDecoding(decodeExecutor, RadolanHdf5File.decodeSharedBoxes, payload, xyxyTupleSet, arrayLambda)
+                if forecastFilter.isLast(forecast):
+                    break
+        finally:
+            tarStream.close()
+
+    @staticmethod
+    def __readForecast(path):
+        # returns the forecast of the HDF5 file or None for other files
+        with open(path, 'rb') as file:
+            if not RadolanHdf5File.isHdf5(file):
+                return None
+            with h5py.File(file, 'r') as h5:
+                return RadolanHdf5File.readInfo(h5)['forecast']
+
     @staticmethod
     def getRadolanDataTimestamp(fileUrl):
-        return urlopen(Request(url=fileUrl, method='HEAD')).getheader('last-modified')
+        return DwdHttp.getLastModified(fileUrl)
     
     @staticmethod
     def __convertToString(datetime):
+        if datetime == None:
+            return None
         return datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
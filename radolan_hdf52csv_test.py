@@ -1,22 +1,7 @@
-from radolan_hdf5 import RadolanHdf5Products
+from radolan_hdf5 import RadolanHdf5File, RadolanHdf5TarFile
 import numpy
-image = None
-curHeader = None
-values = None
-maxValue = 0
-def nextFileCallback(header):
-    global image, curHeader, values
-    if curHeader != None:
-        size=(curHeader['xsize'], curHeader['ysize'])
-        array = numpy.empty(size)
-        for xy in values.keys():
-            array[xy[0], xy[1]] = values[xy]
-        numpy.savetxt(curHeader['product'] + str(curHeader['forecast']) + '_hdf5.csv', array, fmt='%3.2f', delimiter=';')
-    curHeader = header
-    values = {} 
-def valuesCallback(xyTuple, value):
-    global values, maxValue
-    values[xyTuple] = value
-    if value > maxValue:
-        maxValue = value
-RadolanHdf5Products.parseRadolanForecastData('file:./testdata/composite_rv_20250615_1820.tar', {(0,0,1099,1199)}, nextFileCallback, valuesCallback)
\ No newline at end of file
+for fileName, h5 in RadolanHdf5TarFile.getH5Files('file:./testdata/composite_rv_20250615_1820.tar'):
+    info = RadolanHdf5File.readInfo(h5)
+    grid = RadolanHdf5File.readGrid(info, h5['dataset1']['data1']['data'])
+    array = numpy.nan_to_num(grid, nan=-1).T
+    numpy.savetxt(info['product'] + str(info['forecast']) + '_hdf5.csv', array, fmt='%3.2f', delimiter=';')
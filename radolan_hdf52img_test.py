@@ -1,32 +1,15 @@
-from radolan_hdf5 import RadolanHdf5Products
+from radolan_hdf5 import RadolanHdf5File, RadolanHdf5TarFile
 from PIL import Image
-image = None
-curHeader = None
-values = None
+import numpy
 maxValue = 0
-def nextFileCallback(header):
-    global image, curHeader, values
-    if curHeader != None:
-        size=(curHeader['xsize'], curHeader['ysize'])
-        image = Image.new('RGB', size, '#fff')
-        px = image.load()
-        for xy in values.keys():
-            value = values[xy]
-            if value == -1:
-                color = (0, 0, 0)
-            elif value == 0:
-                color = (255, 255, 255)
-            else: 
-                value = 125 - int(round(value/maxValue * 125,0))
-                color = (value, value, value)
-            px[xy[0], xy[1]] = color
-        image.save(curHeader['product'] + str(curHeader['forecast']) + '_hdf5.jpeg')
-        image.close()
-    curHeader = header
-    values = {} 
-def valuesCallback(xyTuple, value):
-    global values, maxValue
-    values[xyTuple] = value
-    if value > maxValue:
-        maxValue = value
-RadolanHdf5Products.parseRadolanForecastData('file:./testdata/composite_rv_20250615_1820.tar', {(0,0,1099,1199)}, nextFileCallback, valuesCallback)
\ No newline at end of file
+for fileName, h5 in RadolanHdf5TarFile.getH5Files('file:./testdata/composite_rv_20250615_1820.tar'):
+    info = RadolanHdf5File.readInfo(h5)
+    grid = RadolanHdf5File.readGrid(info, h5['dataset1']['data1']['data'])
+    maxValue = max(maxValue, numpy.nanmax(grid))
+    pixels = numpy.full(grid.shape, 255, dtype=numpy.uint8)
+    rain = grid > 0
+    pixels[rain] = 125 - numpy.round(grid[rain] / maxValue * 125).astype(numpy.uint8)
+    pixels[numpy.isnan(grid)] = 0
+    image = Image.fromarray(pixels, 'L').convert('RGB')
+    image.save(info['product'] + str(info['forecast']) + '_hdf5.jpeg')
+    image.close()
@@ -0,0 +1,126 @@
+from radolan_hdf5 import RadolanHdf5Products
+from http_test_server import QuietRequestHandler, QuietHTTPServer
+import datetime
+import io
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import h5py
+import numpy
+
+# synthetic tar files in the format of composite_rv_LATEST.tar (smaller grid)
+rng = numpy.random.default_rng(1)
+def createH5(forecast):
+    h5Bytes = io.BytesIO()
+    with h5py.File(h5Bytes, 'w') as h5:
+        h5.create_group('what').attrs.update({'date' : numpy.bytes_(b'20250615'), 'time' : numpy.bytes_(b'182000')})
+        h5.create_group('how').create_group('POLARA').attrs['pattern'] = numpy.bytes_(b'RV')
+        h5.create_group('where').attrs.update({'xsize' : numpy.int64(400), 'ysize' : numpy.int64(300)})
+        dataset = h5.create_group('dataset1')
+        end = datetime.datetime(2025, 6, 15, 18, 20) + datetime.timedelta(minutes=forecast)
+        dataset.create_group('what').attrs.update({'enddate' : numpy.bytes_(end.strftime('%Y%m%d').encode()), 'endtime' : numpy.bytes_(end.strftime('%H%M%S').encode())})
+        data1 = dataset.create_group('data1')
+        data1.create_group('what').attrs.update({'gain' : numpy.float64(0.01), 'offset' : numpy.float64(0.0), 'nodata' : numpy.float64(65535.0)})
+        data = rng.integers(0, 3000, size=(300, 400)).astype(numpy.uint16)
+        data[9, 7] = 100 + forecast
+        data[0, 0] = 65535
+        data1.create_dataset('data', data=data, chunks=(50, 50), compression='gzip')
+    return h5Bytes.getvalue()
+
+def createTar(path, members):
+    with tarfile.open(path, 'w') as tf:
+        for name, data in members:
+            tarInfo = tarfile.TarInfo(name)
+            tarInfo.size = len(data)
+            tf.addfile(tarInfo, io.BytesIO(data))
+
+tarDir = tempfile.mkdtemp()
+members = [('composite_rv_20250615_1820_' + str(forecast).zfill(3) + '.hd5', createH5(forecast)) for forecast in range(0, 125, 5)]
+createTar(os.path.join(tarDir, 'composite_rv_test.tar'), members)
+# an additional member and two members in reverse order
+createTar(os.path.join(tarDir, 'composite_rv_other.tar'), [members[0], ('README.txt', b'not a HDF5 file')] + [members[2], members[1]] + members[3:])
+
+class RangeRequestHandler(QuietRequestHandler):
+
+    # minimal stand-in for the DWD server: supports single "bytes=start-end" ranges
+    sentBytes = 0
+    rangeRequests = 0
+    # like servers (or proxies) which do not support range requests
+    ignoreRange = False
+
+    def do_GET(self):
+        match = re.fullmatch('bytes=([0-9]+)-([0-9]+)', self.headers.get('Range', ''))
+        if match == None or RangeRequestHandler.ignoreRange:
+            return super().do_GET()
+        RangeRequestHandler.rangeRequests += 1
+        path = self.translate_path(self.path)
+        size = os.path.getsize(path)
+        start, end = int(match.group(1)), min(int(match.group(2)), size - 1)
+        with open(path, 'rb') as file:
+            file.seek(start)
+            data = file.read(end - start + 1)
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes ' + str(start) + '-' + str(end) + '/' + str(size))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        RangeRequestHandler.sentBytes += len(data)
+
+server, baseUrl = QuietHTTPServer.start(RangeRequestHandler, tarDir)
+xyxy = (7, 9, 7, 9)
+data = RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', {xyxy}, forecastList=[0, 30])
+print(data)
+assert data == {'timestamp': '2025-06-15T18:20:00Z', 'forecasts': [{'forecast': 0, 'values': {(7, 9): 12.0}}, {'forecast': 30, 'values': {(7, 9): 15.6}}]}
+# only the requested members are downloaded
+assert RangeRequestHandler.sentBytes < os.path.getsize(os.path.join(tarDir, 'composite_rv_test.tar')) / 4
+boxes = {xyxy, (0, 0, 20, 10), (350, 250, 399, 299)}
+localData = RadolanHdf5Products.getRvData(os.path.join(tarDir, 'composite_rv_test.tar'), boxes, maxForecast=25)
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', boxes, maxForecast=25) == localData
+assert localData['forecasts'][0]['values'][(0, 0)] == -1
+# the forecasts are taken from the members, other members are skipped
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_other.tar', boxes, forecastList=[5, 10, 25]) == \
+    {'timestamp': localData['timestamp'], 'forecasts': [localData['forecasts'][index] for index in (2, 1, 5)]}
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_other.tar', boxes, maxForecast=25)['forecasts'][1:3] == \
+    [localData['forecasts'][2], localData['forecasts'][1]]
+# lazy: only the parts of the members read by h5py are fetched
+sentBytes = RangeRequestHandler.sentBytes
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', {xyxy}, lazy=True, forecastList=[0, 30]) == data
+assert RangeRequestHandler.sentBytes - sentBytes < len(members[0][1])
+allData = RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', boxes, lazy=True)
+assert allData['forecasts'][: 6] == localData['forecasts']
+assert len(allData['forecasts']) == len(members)
+# without a forecast filter and lazy the tar file is streamed
+rangeRequests = RangeRequestHandler.rangeRequests
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', boxes) == allData
+assert RangeRequestHandler.rangeRequests == rangeRequests
+# the server answers range requests with the whole file
+RangeRequestHandler.ignoreRange = True
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_other.tar', boxes, forecastList=[5, 10, 25]) == \
+    {'timestamp': localData['timestamp'], 'forecasts': [localData['forecasts'][index] for index in (2, 1, 5)]}
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', boxes, maxForecast=25) == localData
+assert RadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', {xyxy}, lazy=True, forecastList=[0, 30]) == data
+assert RangeRequestHandler.rangeRequests == rangeRequests
+# asyncio: the members are decoded while the tar file is downloaded, other members are skipped
+from dwd_async import AsyncRadolanHdf5Products
+import asyncio
+assert asyncio.run(AsyncRadolanHdf5Products.getRvData(baseUrl + 'composite_rv_other.tar', boxes, forecastList=[5, 10, 25])) == \
+    {'timestamp': localData['timestamp'], 'forecasts': [localData['forecasts'][index] for index in (2, 1, 5)]}
+assert asyncio.run(AsyncRadolanHdf5Products.getRvData(baseUrl + 'composite_rv_test.tar', boxes)) == allData
+server.shutdown()
+
+# the forecasts are yielded while the tar file is read, closing the generator closes the stream
+class ClosingStream(io.BytesIO):
+
+    def close(self):
+        self.closedByGenerator = True
+        super().close()
+
+with open(os.path.join(tarDir, 'composite_rv_test.tar'), 'rb') as file:
+    tarStream = ClosingStream(file.read())
+forecasts = RadolanHdf5Products.iterRadolanForecastData(tarStream, {xyxy}, lambda value: round(value * 12, 2))
+assert next(forecasts) == (0, data['forecasts'][0]['values'])
+forecasts.close()
+assert tarStream.closed and tarStream.closedByGenerator
+shutil.rmtree(tarDir)
@@ -5,3 +5,63 @@ xyxy = (xy[0], xy[1], xy[0], xy[1])
 data = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2',{xyxy})
 print(data)
 assert data == {'timestamp': '2025-06-15T18:20:00Z', 'forecasts': [{'forecast': 0, 'values': {(478, 335): 5.28}}, {'forecast': 5, 'values': {(478, 335): 3.6}}, {'forecast': 10, 'values': {(478, 335): 3.96}}, {'forecast': 15, 'values': {(478, 335): 4.92}}, {'forecast': 20, 'values': {(478, 335): 4.8}}, {'forecast': 25, 'values': {(478, 335): 8.64}}, {'forecast': 30, 'values': {(478, 335): 6.72}}, {'forecast': 35, 'values': {(478, 335): 4.68}}, {'forecast': 40, 'values': {(478, 335): 1.8}}, {'forecast': 45, 'values': {(478, 335): 1.8}}, {'forecast': 50, 'values': {(478, 335): 1.68}}, {'forecast': 55, 'values': {(478, 335): 2.88}}, {'forecast': 60, 'values': {(478, 335): 4.56}}, {'forecast': 65, 'values': {(478, 335): 6.48}}, {'forecast': 70, 'values': {(478, 335): 6.0}}, {'forecast': 75, 'values': {(478, 335): 7.32}}, {'forecast': 80, 'values': {(478, 335): 5.76}}, {'forecast': 85, 'values': {(478, 335): 5.28}}, {'forecast': 90, 'values': {(478, 335): 4.08}}, {'forecast': 95, 'values': {(478, 335): 4.32}}, {'forecast': 100, 'values': {(478, 335): 4.56}}, {'forecast': 105, 'values': {(478, 335): 3.24}}, {'forecast': 110, 'values': {(478, 335): 3.0}}, {'forecast': 115, 'values': {(478, 335): 2.16}}, {'forecast': 120, 'values': {(478, 335): 1.32}}]}
+
+# overlapped download, decompression and decoding
+from radolan import RadolanPipeline
+pipelineData = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy}, pipeline=RadolanPipeline())
+assert pipelineData == data
+
+# members decoded by a process pool
+from concurrent.futures import ProcessPoolExecutor
+with ProcessPoolExecutor(2) as executor:
+    executorData = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', {xyxy}, decodeExecutor=executor)
+assert executorData == data
+
+# overlapping and adjacent boxes are read row by row, each pixel once
+from radolan import RadolanFile
+import io
+import math
+import tarfile
+assert RadolanFile.buildRowSpans({(5, 0, 7, 1), (0, 1, 2, 1), (3, 1, 4, 1), (6, 1, 9, 1)}) == {0: [(5, 7)], 1: [(0, 9)]}
+assert RadolanFile.buildRowSpans({(0, 0, 2, 0), (4, 0, 5, 0)}) == {0: [(0, 2), (4, 5)]}
+overlappingBoxes = {(470, 330, 480, 340), (475, 335, 485, 345)}
+with tarfile.open('./testdata/DE1200_RV2506151820.tar.bz2', 'r:bz2') as tf:
+    memberBytes = tf.extractfile(tf.next()).read()
+stream = io.BytesIO(memberBytes)
+header = RadolanFile.readHeader(stream)
+pixelValues = []
+RadolanFile.readValues(header, stream, overlappingBoxes, lambda xyTuple, value: pixelValues.append((xyTuple, value)))
+stream = io.BytesIO(memberBytes)
+RadolanFile.readHeader(stream)
+boxValues = {}
+def boxesCallback(xyxyTuple, values):
+    x0, y0, x1, y1 = xyxyTuple
+    for y in range(y0, y1 + 1):
+        for x in range(x0, x1 + 1):
+            boxValues[(x, y)] = values[y - y0][x - x0]
+RadolanFile.readBoxes(header, stream, overlappingBoxes, boxesCallback)
+assert len(pixelValues) == len(set(xyTuple for xyTuple, value in pixelValues)) == len(boxValues) == 11 * 11 * 2 - 6 * 6
+for xyTuple, value in pixelValues:
+    expected = boxValues[xyTuple]
+    assert value == -1 if math.isnan(expected) else abs(value - expected) < 1e-9, xyTuple
+
+# the forecasts are yielded while the archive is read, closing the generator closes the stream
+def valueLambda(value):
+    if value > 0:
+        value = float("{:.2f}".format(value * 12))
+    return value
+class ClosingStream(io.BytesIO):
+
+    def close(self):
+        self.closedByGenerator = True
+        super().close()
+
+with open('./testdata/DE1200_RV2506151820.tar.bz2', 'rb') as file:
+    bzStream = ClosingStream(file.read())
+forecasts = RadolanProducts.iterRadolanForecastData(bzStream, overlappingBoxes | {xyxy}, valueLambda)
+forecast, values = next(forecasts)
+firstForecast = RadolanProducts.getRvData('file:./testdata/DE1200_RV2506151820.tar.bz2', overlappingBoxes | {xyxy})['forecasts'][0]
+assert forecast == 0 and values == firstForecast['values'] and values[(478, 335)] == 5.28
+assert not bzStream.closed
+forecasts.close()
+assert bzStream.closed and bzStream.closedByGenerator
@@ -0,0 +1,138 @@
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import wait
+import numpy
+
+class SharedPayload:
+
+    # file backed shared memory (on tmpfs /dev/shm where available) for the decode workers:
+    # the member payloads and the decoded boxes are exchanged by the path of the file
+    # and memory mapped by both sides instead of being pickled
+    shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+    def __init__(self, size):
+        handle, self.path = tempfile.mkstemp(prefix='dwd_payload_', dir=SharedPayload.shared_dir)
+        os.ftruncate(handle, max(size, 1))
+        os.close(handle)
+        self.size = size
+
+    def readFrom(self, stream):
+        # copies size bytes of the stream directly into the shared memory
+        data = numpy.memmap(self.path, dtype=numpy.uint8, mode='r+', shape=(max(self.size, 1),))
+        view = memoryview(data)
+        try:
+            pos = 0
+            while pos < self.size:
+                length = stream.readinto(view[pos : self.size])
+                assert length > 0, 'file too short'
+                pos += length
+        finally:
+            view.release()
+            del data
+
+    def readBoxes(self, xyxyList):
+        # returns [(xyxyTuple, values), ...] with copies of the boxes written by writeBoxes
+        data = numpy.memmap(self.path, dtype=numpy.float64, mode='r', shape=(max(self.size // 8, 1),))
+        boxes = []
+        pos = 0
+        for xyxyTuple in xyxyList:
+            x0, y0, x1, y1 = xyxyTuple
+            shape = (y1 - y0 + 1, x1 - x0 + 1)
+            boxes.append((xyxyTuple, numpy.array(data[pos : pos + shape[0] * shape[1]]).reshape(shape)))
+            pos += shape[0] * shape[1]
+        del data
+        return boxes
+
+    @staticmethod
+    def copyFrom(stream, size):
+        # returns a new SharedPayload with the next size bytes of the stream
+        payload = SharedPayload(size)
+        try:
+            payload.readFrom(stream)
+        except:
+            payload.release()
+            raise
+        return payload
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def getBoxesSize(xyxyList):
+        return sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, y0, x1, y1 in xyxyList) * 8
+
+    @staticmethod
+    def writeBoxes(path, boxValues):
+        # writes the float64 arrays (in the order of the boxes) into the shared memory, used by the workers
+        size = sum(values.size for values in boxValues)
+        if size == 0:
+            return
+        data = numpy.memmap(path, dtype=numpy.float64, mode='r+', shape=(size,))
+        pos = 0
+        for values in boxValues:
+            data[pos : pos + values.size] = values.ravel()
+            pos += values.size
+        data.flush()
+        del data
+
+class SharedDecoding:
+
+    # decodes the boxes of a member payload by an executor (e.g. a ProcessPoolExecutor), the payload
+    # and the decoded boxes are exchanged through shared memory instead of being pickled
+    # members decoded ahead of the consumer by iterResults
+    decode_ahead = 8
+
+    def __init__(self, executor, decode, payload, xyxyTupleSet, arrayLambda=None, args=()):
+        # decode(payloadPath, boxesPath, xyxyList, *args) runs in the executor, writes the boxes with
+        # SharedPayload.writeBoxes and returns the header of the member
+        # payload - filled SharedPayload of the member, it is released by this object
+        self.payload = payload
+        self.xyxyList = list(xyxyTupleSet)
+        self.arrayLambda = arrayLambda
+        self.boxes = None
+        self.future = None
+        try:
+            self.boxes = SharedPayload(SharedPayload.getBoxesSize(self.xyxyList))
+            self.future = executor.submit(decode, payload.path, self.boxes.path, self.xyxyList, *args)
+        except:
+            self.cancel()
+            raise
+
+    def result(self):
+        # returns (header, [(xyxyTuple, values), ...]) and releases the shared memory
+        try:
+            header = self.future.result()
+            boxes = self.boxes.readBoxes(self.xyxyList)
+        finally:
+            self.cancel()
+        if self.arrayLambda != None:
+            boxes = [(xyxyTuple, self.arrayLambda(values)) for xyxyTuple, values in boxes]
+        return header, boxes
+
+    def cancel(self):
+        if self.future != None and not self.future.cancel():
+            wait([self.future]) # the worker still uses the shared memory
+        self.payload.release()
+        if self.boxes != None:
+            self.boxes.release()
+
+    @staticmethod
+    def iterResults(tasks):
+        # yields the results of the tasks (generator of SharedDecoding objects) in order,
+        # up to decode_ahead following tasks are decoded meanwhile
+        pending = deque()
+        try:
+            for task in tasks:
+                pending.append(task)
+                while len(pending) > SharedDecoding.decode_ahead:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            for task in pending:
+                task.cancel()
+            tasks.close()
@@ -0,0 +1,58 @@
+import bz2
+import tarfile
+
+class TarChunkParser:
+
+    # incremental parser of a tar file which is fed with its chunks (e.g. while it is downloaded by asyncio),
+    # the regular members are returned as soon as they are complete, the other members (e.g. directories) are skipped
+    # bzip2 - the chunks are of a .tar.bz2 file (one or more bzip2 streams)
+    block_size = tarfile.BLOCKSIZE
+
+    def __init__(self, bzip2=False):
+        self.decompressor = bz2.BZ2Decompressor() if bzip2 else None
+        self.buffer = bytearray()
+        self.member = None # TarInfo of the member whose data is being collected
+        self.longName = None # GNU long name of the next member
+        self.eof = False
+
+    def feed(self, data):
+        # returns [(name, bytes), ...] of the members completed by the chunk
+        if self.eof:
+            return []
+        if self.decompressor != None:
+            data = self.__decompress(data)
+        self.buffer += data
+        members = []
+        blockSize = TarChunkParser.block_size
+        while True:
+            if self.member == None:
+                if len(self.buffer) < blockSize:
+                    break
+                block = bytes(self.buffer[: blockSize])
+                del self.buffer[: blockSize]
+                if block == tarfile.NUL * blockSize:
+                    self.eof = True # end of the archive
+                    break
+                self.member = tarfile.TarInfo.frombuf(block, tarfile.ENCODING, 'surrogateescape')
+                continue
+            paddedSize = -(-self.member.size // blockSize) * blockSize
+            if len(self.buffer) < paddedSize:
+                break
+            memberBytes = bytes(self.buffer[: self.member.size])
+            del self.buffer[: paddedSize]
+            if self.member.type == tarfile.GNUTYPE_LONGNAME:
+                self.longName = memberBytes.rstrip(tarfile.NUL).decode(tarfile.ENCODING, 'surrogateescape')
+            elif self.member.isreg():
+                members.append((self.member.name if self.longName == None else self.longName, memberBytes))
+                self.longName = None
+            self.member = None
+        return members
+
+    def __decompress(self, data):
+        chunks = []
+        while len(data) > 0:
+            if self.decompressor.eof:
+                self.decompressor = bz2.BZ2Decompressor() # next bzip2 stream
+            chunks.append(self.decompressor.decompress(data))
+            data = self.decompressor.unused_data if self.decompressor.eof else b''
+        return b''.join(chunks)
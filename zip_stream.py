@@ -0,0 +1,89 @@
+import io
+import struct
+import zlib
+
+class ZipEntryStream(io.RawIOBase):
+
+    # reads the first entry of a zip file sequentially from a (non seekable) stream,
+    # the entry is located by its local file header instead of the central directory
+    # at the end of the file, so it can be inflated while the zip file is still being downloaded
+    local_header = struct.Struct('<4sHHHHHIIIHH')
+    local_header_signature = b'PK\x03\x04'
+    descriptor_signature = b'PK\x07\x08'
+    chunk_size = 64 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        (signature, version, self.flags, self.method, time, date, self.crc, self.compressedSize, self.size,
+            nameLength, extraLength) = ZipEntryStream.local_header.unpack(ZipEntryStream.__readExactly(stream, ZipEntryStream.local_header.size))
+        assert signature == ZipEntryStream.local_header_signature, 'local file header is missing -> wrong file format'
+        assert self.flags & 0x1 == 0, 'encrypted zip entries are not supported'
+        assert self.method in (0, 8), 'compression method ' + str(self.method) + ' is not supported'
+        self.name = ZipEntryStream.__readExactly(stream, nameLength).decode('utf-8' if self.flags & 0x800 else 'cp437')
+        ZipEntryStream.__readExactly(stream, extraLength)
+        # bit 3: crc and sizes follow the data in a data descriptor
+        self.hasDescriptor = self.flags & 0x8 != 0
+        assert self.method == 8 or not self.hasDescriptor, 'stored entry without size'
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if self.method == 8 else None
+        self.remaining = self.compressedSize # only for stored entries
+        self.pending = b''
+        self.pos = 0
+        self.readCrc = 0
+        self.eof = False
+
+    @property
+    def tail(self):
+        # data after the entry which was already read from the stream
+        return self.decompressor.unused_data if self.decompressor != None else b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.pos >= len(self.pending) and not self.eof:
+            self.pending = self.__readChunk()
+            self.pos = 0
+        length = min(len(buffer), len(self.pending) - self.pos)
+        buffer[:length] = self.pending[self.pos : self.pos + length]
+        self.pos += length
+        return length
+
+    def __readChunk(self):
+        if self.decompressor == None:
+            data = self.stream.read(min(ZipEntryStream.chunk_size, self.remaining))
+            assert len(data) > 0 or self.remaining == 0, 'zip entry too short'
+            self.remaining -= len(data)
+            self.readCrc = zlib.crc32(data, self.readCrc)
+            if self.remaining == 0:
+                self.__finish()
+            return data
+        data = self.stream.read(ZipEntryStream.chunk_size)
+        assert len(data) > 0, 'zip entry too short'
+        chunk = self.decompressor.decompress(data)
+        self.readCrc = zlib.crc32(chunk, self.readCrc)
+        if self.decompressor.eof:
+            self.__finish()
+        return chunk
+
+    def __finish(self):
+        self.eof = True
+        if not self.hasDescriptor:
+            crc = self.crc
+        else:
+            # the descriptor is partly in the unused data of the decompressor
+            descriptor = self.tail + ZipEntryStream.__readExactly(self.stream, max(0, 16 - len(self.tail)), False)
+            if descriptor[0:4] == ZipEntryStream.descriptor_signature:
+                descriptor = descriptor[4:]
+            crc = struct.unpack('<I', descriptor[0:4])[0]
+        assert self.readCrc == crc, 'crc of the zip entry ' + self.name + ' does not match'
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+    @staticmethod
+    def __readExactly(stream, length, exactly=True):
+        data = stream.read(length)
+        assert not exactly or len(data) == length, 'file too short'
+        return data